@@ -0,0 +1,89 @@
+"""
+頭像下載
+kol_avatar_fetcher 與 kol_avatar_selenium 共用的串流下載：邊下載邊寫入 avatar_store，
+並對 resolve cache 中的同一張圖送出條件式請求；下載後以 dHash 篩掉預設 / 重複頭像
+"""
+
+import time
+
+import http_client
+import metrics
+import platforms
+from http_client import HEADERS
+from resolve_cache import get_resolve_cache
+from avatar_store import MAX_IMAGE_BYTES, ImageRejected, get_avatar_store
+from avatar_hash import PLACEHOLDER, screen_avatar
+from kol_matcher import safe_filename
+from run_manifest import FAILED
+
+# --- 設定區 ---
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_REJECTED_URLS = 2   # 預設頭像 / 重複頭像最多排除幾個 URL 重新解析
+
+def download_image(name, url, social_link=None):
+    """
+    以串流方式下載圖片並儲存到本地
+    依檔頭 magic bytes 決定副檔名，非圖片或超過 MAX_IMAGE_BYTES 會提早中止；
+    有 social_link 時會對快取中同一張圖送出條件式請求，304 直接沿用既有檔案
+    """
+    cache = get_resolve_cache()
+    entry = cache.get(social_link) if social_link else None
+    try:
+        with metrics.span('download'):
+            conditional = cache.image_headers(entry, url)
+            response = http_client.get(url, headers={**HEADERS, **conditional}, timeout=15, stream=True)
+            try:
+                if response.status_code == 304 and conditional:
+                    return entry['image_path']
+                if response.status_code == 200:
+                    declared = int(response.headers.get('content-length') or 0)
+                    if declared > MAX_IMAGE_BYTES:
+                        raise ImageRejected(f"超過大小上限 {MAX_IMAGE_BYTES} bytes")
+                    # 等待網路的時間算在 download，其餘（hash、寫檔、fsync）記為 write
+                    chunks = metrics.ChunkTimer(response.iter_content(DOWNLOAD_CHUNK_SIZE))
+                    started = time.perf_counter()
+                    try:
+                        filepath = get_avatar_store().save_stream(name, safe_filename(name), chunks)
+                    finally:
+                        metrics.record_write(chunks, time.perf_counter() - started)
+                    if social_link:
+                        cache.save_image(social_link, url, response.headers, filepath)
+                    return filepath
+            finally:
+                response.close()
+    except Exception as e:
+        print(f"    下載失敗: {e}")
+    return None
+
+def download_screened(clean_name, avatar_url, platform, social_link, lines, manifest=None):
+    """
+    下載頭像並以 dHash 索引檢查，回傳 (本地路徑, 頭像 URL, 平台, 判定)
+    預設頭像或與其他 KOL 重複時排除該 URL 重新解析（透過共用的平台註冊表）；
+    找不到替代時預設頭像捨棄、重複頭像保留；
+    認定為預設頭像時，先前已採用同一張圖的 KOL 也被捨棄，並在 manifest 記為失敗，下次執行會重新抓取
+    """
+    rejected = set()
+    while True:
+        local_path = download_image(clean_name, avatar_url, social_link)
+        if not local_path:
+            return None, avatar_url, platform, None
+        verdict, others = screen_avatar(clean_name)
+        if not verdict:
+            return local_path, avatar_url, platform, None
+        label = '預設頭像' if verdict == PLACEHOLDER else f"與 {'、'.join(others[:3])} 重複"
+        lines.append(f"    ⚠ {label}")
+        if verdict == PLACEHOLDER and others:
+            lines.append(f"    ⚠ {'、'.join(others[:3])} 先前下載的也是這張預設頭像，已移除並待重新抓取")
+            if manifest is not None:
+                for other in others:
+                    manifest.mark(other, FAILED, error='placeholder')
+        rejected.add(avatar_url)
+        retry_url = None
+        if len(rejected) <= MAX_REJECTED_URLS:
+            retry_url, retry_platform = platforms.fetch_avatar_by_platform(
+                social_link, platforms.get_registry(), exclude=rejected
+            )
+        if not retry_url:
+            return (None if verdict == PLACEHOLDER else local_path), avatar_url, platform, verdict
+        lines.append(f"    ↻ 重新解析，改用 {retry_platform} 的其他結果")
+        avatar_url, platform = retry_url, retry_platform
@@ -0,0 +1,243 @@
+"""
+頭像感知雜湊（dHash）索引
+為每位 KOL 的頭像計算 64-bit dHash，放進 BK-tree 以漢明距離快速查詢相近圖片，
+用來在下載當下辨識平台預設頭像（Facebook 灰色剪影、YouTube 預設頭像等）與「和別人同一張」的重複頭像
+"""
+
+import os
+import json
+import threading
+
+from avatar_store import atomic_write, get_avatar_store
+
+# --- 設定區 ---
+HASH_CACHE_FILE = os.path.join("avatar_store", "dhash.json")   # sha256 → dHash，避免重複解碼圖片
+LEARNED_PLACEHOLDER_FILE = os.path.join("avatar_store", "placeholders.json")   # LEARN_PLACEHOLDERS 開啟時自動認定的預設頭像 dHash
+PLACEHOLDER_DIR = "placeholders"    # 放入已知的預設頭像圖檔作為比對樣本
+PLACEHOLDER_HASHES = []             # 也可以直接列出預設頭像的 dHash（16 位 hex）
+DUPLICATE_DISTANCE = 6              # 漢明距離在此以內視為同一張圖
+LEARN_PLACEHOLDERS = False          # 開啟後，同一張圖出現在 PLACEHOLDER_MIN_KOLS 位 KOL 時自動視為預設頭像並記下來
+PLACEHOLDER_MIN_KOLS = 3            # （預設關閉：讀書會、公司 logo 這類多人共用的真實頭像會被誤刪）
+
+PLACEHOLDER = 'placeholder'
+DUPLICATE = 'duplicate'
+
+def dhash(path, hash_size=8):
+    """計算圖片的 dHash（相鄰像素亮度差），回傳 int；Pillow 未安裝或無法解碼時回傳 None"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as img:
+            pixels = list(img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """以漢明距離建立的 BK-tree，每個節點存放同一個 hash 的所有 key"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, key):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [key], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [key], {})
+                return
+            node = child
+
+    def remove(self, key):
+        """移除 key（節點保留，之後的查詢不會再回傳此 key）"""
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            if key in node[1]:
+                node[1].remove(key)
+                self.size -= 1
+                return True
+            stack.extend(node[2].values())
+        return False
+
+    def query(self, value, max_distance):
+        """回傳距離在 max_distance 以內的 [(距離, key)]，依距離排序"""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, key) for key in node[1])
+            # 三角不等式：只有距離落在 [d - r, d + r] 的子樹可能有結果
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(results, key=lambda item: item[0])
+
+class AvatarHashIndex:
+    """AvatarStore 中所有 KOL 頭像的 dHash 索引（thread-safe）"""
+
+    def __init__(self, store=None, cache_file=HASH_CACHE_FILE, placeholder_dir=PLACEHOLDER_DIR,
+                 learned_file=LEARNED_PLACEHOLDER_FILE):
+        self.store = store or get_avatar_store()
+        self.cache_file = cache_file
+        self.learned_file = learned_file
+        self.lock = threading.Lock()
+        self.digest_hashes = self._load_cache()
+        self.kol_hashes = {}
+        self.tree = BKTree()
+        self.learned = self._load_learned()
+        self.placeholders = [int(h, 16) for h in PLACEHOLDER_HASHES] + self.learned
+        if os.path.isdir(placeholder_dir):
+            for filename in sorted(os.listdir(placeholder_dir)):
+                value = dhash(os.path.join(placeholder_dir, filename))
+                if value is not None:
+                    self.placeholders.append(value)
+        for kol_name, record in list(self.store.manifest.items()):
+            value = self._hash_blob(record)
+            if value is not None:
+                self.kol_hashes[kol_name] = value
+                self.tree.add(value, kol_name)
+
+    def _load_cache(self):
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return {digest: int(value, 16) for digest, value in json.load(f).items()}
+        return {}
+
+    def _load_learned(self):
+        if LEARN_PLACEHOLDERS and self.learned_file and os.path.exists(self.learned_file):
+            with open(self.learned_file, 'r', encoding='utf-8') as f:
+                return [int(value, 16) for value in json.load(f)]
+        return []
+
+    def save(self):
+        with self.lock:
+            data = {digest: f"{value:016x}" for digest, value in self.digest_hashes.items()}
+            learned = [f"{value:016x}" for value in self.learned]
+        atomic_write(self.cache_file, json.dumps(data, indent=2).encode('utf-8'))
+        if LEARN_PLACEHOLDERS and self.learned_file:
+            atomic_write(self.learned_file, json.dumps(learned, indent=2).encode('utf-8'))
+
+    def _hash_blob(self, record):
+        digest = record['sha256']
+        if digest not in self.digest_hashes:
+            value = dhash(self.store.blob_path(digest, record['ext']))
+            if value is None:
+                return None
+            self.digest_hashes[digest] = value
+        return self.digest_hashes[digest]
+
+    def is_known_placeholder(self, value):
+        """是否接近 placeholders/ 樣本、PLACEHOLDER_HASHES 或（開啟 LEARN_PLACEHOLDERS 時）自動認定的預設頭像"""
+        return any(hamming(value, p) <= DUPLICATE_DISTANCE for p in self.placeholders)
+
+    def _is_placeholder(self, value, matches):
+        if self.is_known_placeholder(value):
+            return True
+        # 加上自己，同一張圖已出現在 PLACEHOLDER_MIN_KOLS 位以上的 KOL：記下來當作樣本（save 時一併保存）
+        if LEARN_PLACEHOLDERS and len(matches) + 1 >= PLACEHOLDER_MIN_KOLS:
+            with self.lock:
+                self.placeholders.append(value)
+                self.learned.append(value)
+            return True
+        return False
+
+    def check(self, kol_name):
+        """
+        更新 KOL 目前頭像的 hash 並檢查，回傳 (判定, 相同圖片的其他 KOL)
+        判定為 PLACEHOLDER、DUPLICATE 或 None；無法計算 hash 時一律回傳 (None, [])
+        """
+        record = self.store.lookup(kol_name)
+        if not record:
+            return None, []
+        with self.lock:
+            value = self._hash_blob(record)
+            if value is None:
+                return None, []
+            if kol_name in self.kol_hashes:
+                self.tree.remove(kol_name)
+            self.kol_hashes[kol_name] = value
+            matches = [key for _, key in self.tree.query(value, DUPLICATE_DISTANCE) if key != kol_name]
+            self.tree.add(value, kol_name)
+        if self._is_placeholder(value, matches):
+            return PLACEHOLDER, matches
+        if matches:
+            return DUPLICATE, matches
+        return None, []
+
+    def forget(self, kol_name):
+        """KOL 的頭像被捨棄後移出索引"""
+        with self.lock:
+            if self.kol_hashes.pop(kol_name, None) is not None:
+                self.tree.remove(kol_name)
+
+    def clusters(self):
+        """列出所有重複的群組 [[KOL, ...], ...]，每組至少兩位"""
+        with self.lock:
+            seen = set()
+            groups = []
+            for kol_name, value in self.kol_hashes.items():
+                if kol_name in seen:
+                    continue
+                group = [key for _, key in self.tree.query(value, DUPLICATE_DISTANCE) if key not in seen]
+                seen.update(group)
+                if len(group) > 1:
+                    groups.append(sorted(group))
+        return groups
+
+_avatar_hash_index = None
+_avatar_hash_index_lock = threading.Lock()
+
+def get_avatar_hash_index():
+    """取得全域共用的 AvatarHashIndex"""
+    global _avatar_hash_index
+    if _avatar_hash_index is None:
+        with _avatar_hash_index_lock:
+            if _avatar_hash_index is None:
+                _avatar_hash_index = AvatarHashIndex()
+    return _avatar_hash_index
+
+def screen_avatar(kol_name):
+    """
+    檢查 KOL 剛下載的頭像，回傳 (判定, 相同圖片的其他 KOL)
+    判定為預設頭像時會把檔案從 kol_avatars/ 移除；先前已被其他 KOL 採用的同一張圖（例如樣本加入前下載的）
+    也一併移除（others 即這些 KOL，呼叫端應在 run manifest 改記為失敗以便重新抓取）；
+    多人共用的圖只會判定為重複頭像，保留由呼叫端決定
+    """
+    index = get_avatar_hash_index()
+    verdict, others = index.check(kol_name)
+    if verdict == PLACEHOLDER:
+        for name in (kol_name, *others):
+            index.store.discard(name)
+            index.forget(name)
+    return verdict, others
+
+if __name__ == "__main__":
+    index = get_avatar_hash_index()
+    index.save()
+    groups = index.clusters()
+    print(f"已索引 {len(index.kol_hashes)} 張頭像，{len(groups)} 組重複：")
+    for group in groups:
+        label = "預設頭像" if index.is_known_placeholder(index.kol_hashes[group[0]]) else "重複"
+        print(f"  [{label}] {', '.join(group)}")
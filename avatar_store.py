@@ -0,0 +1,257 @@
+"""
+內容定址的頭像儲存區
+圖片以 SHA-256 命名存放在 avatar_store/blobs/，寫入一律經過暫存檔再 rename（不會留下半個檔案），
+manifest 記錄每位 KOL 對應的 blob；kol_avatars/ 裡的檔名只是由 manifest 建出的 hard link 視圖
+執行期間的 manifest 變更逐筆附加到 manifest.log.jsonl，compact() 時才整理回 manifest.json
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from image_probe import SNIFF_BYTES, sniff_image_type
+
+# --- 設定區 ---
+STORE_DIR = "avatar_store"
+VIEW_DIR = "kol_avatars"
+MAX_IMAGE_BYTES = 5 * 1024 * 1024   # 單張頭像上限，超過即中止下載
+
+class ImageRejected(ValueError):
+    """下載內容不是圖片或超過大小上限"""
+
+def _default_file_mode():
+    """一般 open() 建檔時的權限（0666 扣掉 umask）；os.umask 只能設定後再還原才讀得到"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+FILE_MODE = _default_file_mode()
+
+def publish_temp_file(tmp_path, path):
+    """
+    把 mkstemp 建立的暫存檔換成正式檔案
+    mkstemp 的權限固定是 0600，先改回 umask 預設值，網頁伺服器或共用資料夾才讀得到
+    """
+    os.chmod(tmp_path, FILE_MODE)
+    os.replace(tmp_path, path)
+
+def atomic_write(path, data):
+    """先寫到同目錄的暫存檔，再以 os.replace 原子地換上"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        publish_temp_file(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def link_or_copy(src, dst):
+    """以 hard link 建立 dst（不支援時改為複製），同樣透過暫存檔原子替換"""
+    directory = os.path.dirname(dst) or '.'
+    tmp_path = os.path.join(directory, f".tmp-{os.getpid()}-{threading.get_ident()}-{os.path.basename(dst)}")
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class AvatarStore:
+    """SHA-256 blob 儲存區 + KOL → blob 的 manifest"""
+
+    def __init__(self, store_dir=STORE_DIR, view_dir=VIEW_DIR):
+        self.store_dir = store_dir
+        self.blob_dir = os.path.join(store_dir, 'blobs')
+        self.manifest_file = os.path.join(store_dir, 'manifest.json')
+        self.log_file = os.path.join(store_dir, 'manifest.log.jsonl')
+        self.view_dir = view_dir
+        self.lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.view_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self.log = open(self.log_file, 'a', encoding='utf-8')
+
+    def _load_manifest(self):
+        """讀取上次 compact 的 manifest.json，再重播之後附加的變更；忽略中斷時寫壞的最後一行"""
+        manifest = {}
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry['record'] is None:
+                        manifest.pop(entry['kol'], None)
+                    else:
+                        manifest[entry['kol']] = entry['record']
+        return manifest
+
+    def _log_change(self, kol_name, record):
+        """附加一筆變更（record 為 None 表示移除），呼叫端需持有 self.lock"""
+        self.log.write(json.dumps({'kol': kol_name, 'record': record}, ensure_ascii=False) + '\n')
+        self.log.flush()
+
+    def compact(self):
+        """把目前的 manifest 寫回 manifest.json 並清空變更紀錄（每次執行結束時呼叫一次）"""
+        with self.lock:
+            data = json.dumps(self.manifest, ensure_ascii=False, indent=2).encode('utf-8')
+            atomic_write(self.manifest_file, data)
+            self.log.close()
+            self.log = open(self.log_file, 'w', encoding='utf-8')
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}{ext}")
+
+    def put_bytes(self, data, ext):
+        """寫入 blob 並回傳 SHA-256；相同內容已存在時不重寫"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest, ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, data)
+        return digest
+
+    def assign(self, kol_name, digest, ext, view_name):
+        """把 KOL 指向某個 blob，並在 kol_avatars/ 建立（或更新）對應的檔名視圖"""
+        with self.lock:
+            view_path = os.path.join(self.view_dir, view_name)
+            previous = self.manifest.get(kol_name)
+            unchanged = (previous and previous['sha256'] == digest
+                         and previous['view'] == view_name and os.path.exists(view_path))
+            if not unchanged:
+                link_or_copy(self.blob_path(digest, ext), view_path)
+                self.manifest[kol_name] = {'sha256': digest, 'ext': ext, 'view': view_name}
+                if previous and previous['view'] != view_name:
+                    self._remove_view(previous['view'])
+                self._log_change(kol_name, self.manifest[kol_name])
+            return view_path
+
+    def save(self, kol_name, view_name, data):
+        """儲存圖片內容並回傳 kol_avatars/ 下的視圖路徑"""
+        ext = os.path.splitext(view_name)[1]
+        digest = self.put_bytes(data, ext)
+        return self.assign(kol_name, digest, ext, view_name)
+
+    def save_stream(self, kol_name, view_stem, chunks, max_bytes=MAX_IMAGE_BYTES):
+        """
+        邊下載邊寫入暫存檔並計算 SHA-256，回傳 kol_avatars/ 下的視圖路徑
+        依第一段內容的 magic bytes 決定副檔名；不是圖片或超過 max_bytes 時丟出 ImageRejected
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, prefix='.tmp-')
+        try:
+            hasher = hashlib.sha256()
+            size = 0
+            head = b''
+            ext = None
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if ext is None:
+                        head += chunk
+                        if len(head) < SNIFF_BYTES:
+                            continue
+                        ext = sniff_image_type(head)
+                        if ext is None:
+                            raise ImageRejected("內容不是圖片")
+                        chunk, head = head, b''
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ImageRejected(f"超過大小上限 {max_bytes} bytes")
+                    hasher.update(chunk)
+                    f.write(chunk)
+                if ext is None:
+                    # 整個回應比檔頭還短
+                    ext = sniff_image_type(head)
+                    if ext is None:
+                        raise ImageRejected("內容不是圖片")
+                    hasher.update(head)
+                    f.write(head)
+                f.flush()
+                os.fsync(f.fileno())
+            digest = hasher.hexdigest()
+            path = self.blob_path(digest, ext)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                publish_temp_file(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.assign(kol_name, digest, ext, f"{view_stem}{ext}")
+
+    def lookup(self, kol_name):
+        return self.manifest.get(kol_name)
+
+    def find_by_view(self, view_name):
+        """由 kol_avatars/ 的檔名反查 manifest 中的 KOL key"""
+        for kol_name, record in self.manifest.items():
+            if record['view'] == view_name:
+                return kol_name
+        return None
+
+    def rename_view(self, kol_name, view_name):
+        """更改 KOL 在 kol_avatars/ 的檔名（只重建 link，不搬動 blob）"""
+        record = self.manifest[kol_name]
+        return self.assign(kol_name, record['sha256'], record['ext'], view_name)
+
+    def discard(self, kol_name):
+        """移除 KOL 的頭像紀錄與檔名視圖（blob 保留，之後相同內容不必重寫）"""
+        with self.lock:
+            record = self.manifest.pop(kol_name, None)
+            if record:
+                self._remove_view(record['view'])
+                self._log_change(kol_name, None)
+            return record
+
+    def _remove_view(self, view_name):
+        path = os.path.join(self.view_dir, view_name)
+        if os.path.exists(path) and not any(
+                r['view'] == view_name for r in self.manifest.values()):
+            os.remove(path)
+
+    def rebuild_views(self):
+        """依 manifest 重建 kol_avatars/ 中所有的檔名視圖（一併修正先前以 0600 寫入的 blob 權限）"""
+        with self.lock:
+            for record in self.manifest.values():
+                blob = self.blob_path(record['sha256'], record['ext'])
+                os.chmod(blob, FILE_MODE)
+                view_path = os.path.join(self.view_dir, record['view'])
+                link_or_copy(blob, view_path)
+        return len(self.manifest)
+
+_avatar_store = None
+_avatar_store_lock = threading.Lock()
+
+def get_avatar_store():
+    """取得全域共用的 AvatarStore"""
+    global _avatar_store
+    if _avatar_store is None:
+        with _avatar_store_lock:
+            if _avatar_store is None:
+                _avatar_store = AvatarStore()
+    return _avatar_store
+
+if __name__ == "__main__":
+    store = get_avatar_store()
+    count = store.rebuild_views()
+    store.compact()
+    print(f"已依 manifest 重建 {count} 個頭像檔名")
@@ -0,0 +1,263 @@
+"""
+清洗、比對與 HTML 產生的 CPU 微效能測試
+以固定亂數種子產生含 CJK 姓名、括號暱稱、emoji 開頭與同行人的原始名單，
+在 10² ~ 10⁵ 筆下分別量測各階段耗時；可把結果存成基準，之後比較是否變慢
+
+用法:
+    python benchmarks/bench_cpu.py                     # 量測並與基準比較（有基準時）
+    python benchmarks/bench_cpu.py --save-baseline     # 量測並存成新的基準
+    python benchmarks/bench_cpu.py --sizes 100,1000 --stages clean_scalar,card_html
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import pandas as pd
+
+import clean_kol_list
+import regenerate_html
+from kol_dedup import DedupIndex
+from kol_matcher import KolMatcher, safe_filename
+from search_index import build_search_index
+
+# --- 設定區 ---
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'cpu.json')
+REGRESSION_RATIO = 1.2      # 比基準慢超過此倍數視為退步
+MIN_REPEAT_SECONDS = 1.0    # 小資料量時重複執行，直到累計超過此秒數（取最快一次）
+MAX_REPEATS = 50
+SEED = 20240501
+
+# 產生名單用的字庫
+SURNAMES = '陳林黃張李王吳劉蔡楊許鄭謝郭洪曾邱廖賴周徐蘇葉莊呂江何蕭羅高'
+GIVEN_CHARS = '志明怡君雅婷家豪俊傑淑芬美玲建宏惠如宗翰佳穎文彥詩涵子軒宇庭欣柏瑋'
+TOPICS = ['說書', '心理師', '讀書會', '理財', '旅行', '料理', '親子', '職涯', '科技', '投資']
+TOPIC_SUFFIXES = ['日記', '小姐', '先生', 'Podcast', '頻道', '筆記', '研究所', '']
+ENGLISH_NAMES = ['Amy', 'Kevin', 'Iris', 'Leo', 'Grace', 'Ryan', 'Vivian', 'Jason']
+EMOJIS = ['🔖', '⭐', '📚', '🎙️']
+PLATFORM_LINKS = [
+    'https://www.instagram.com/{}/',
+    'https://www.facebook.com/{}',
+    'https://www.youtube.com/@{}',
+]
+
+def random_person(rng):
+    return rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.choice((1, 2, 2, 2))))
+
+def random_topic(rng):
+    return rng.choice(TOPICS) + rng.choice(TOPIC_SUFFIXES)
+
+def raw_name(rng, person, topic):
+    """各種原始「姓名」欄位寫法"""
+    kind = rng.random()
+    if kind < 0.30:
+        return person
+    if kind < 0.50:
+        return f"{person} ({topic}YT{rng.randint(1, 99)}.{rng.randint(0, 9)}萬)大咖"
+    if kind < 0.62:
+        return f"{rng.choice(EMOJIS)}{person}（{rng.choice(ENGLISH_NAMES)}）"
+    if kind < 0.72:
+        return f"{person}-{topic}"
+    if kind < 0.80:
+        return f"{person} 同行人"
+    if kind < 0.88:
+        return f"{rng.choice(ENGLISH_NAMES)} {person}"
+    return f"{person}（{topic}，粉絲{rng.randint(1, 50)}萬）"
+
+def make_raw_frame(n, seed=SEED):
+    """產生 n 列與 kol_list_booklunch.xlsx 相同欄位的原始名單"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        person, topic = random_person(rng), random_topic(rng)
+        has_link = rng.random() < 0.8
+        rows.append({
+            '姓名': raw_name(rng, person, topic),
+            '社群名稱': f"{topic} ({rng.choice(('IG', 'FB', 'YT'))})" if rng.random() < 0.4 else None,
+            '主要社群': rng.choice(PLATFORM_LINKS).format(f"kol{i}") if has_link else None,
+            'Email信箱/LINE': f"kol{i}@example.com" if rng.random() < 0.5 else None,
+        })
+    return pd.DataFrame(rows)
+
+def image_names(kol_list, seed=SEED):
+    """頭像資料夾中的檔名：多數為 safe_filename(name)，部分改用顯示名稱、加後綴或無對應"""
+    rng = random.Random(seed)
+    names = []
+    for kol in kol_list:
+        kind = rng.random()
+        if kind < 0.70:
+            names.append(safe_filename(kol['name']))
+        elif kind < 0.85:
+            names.append(safe_filename(kol['display_name']))
+        elif kind < 0.95:
+            names.append(safe_filename(kol['name']) + '_頭像')
+        else:
+            names.append(f"unknown_{rng.randrange(10 ** 9)}")
+    return list(dict.fromkeys(names))
+
+# ==================== 各階段 ====================
+
+def stage_clean_scalar(data):
+    """clean_kol_list.extract_clean_name 逐列呼叫"""
+    has_links = data['raw']['主要社群'].fillna('').str.startswith('http').tolist()
+    names = data['raw']['姓名'].tolist()
+    return lambda: [clean_kol_list.extract_clean_name(name, link) for name, link in zip(names, has_links)]
+
+def stage_clean_vectorized(data):
+    """clean_kol_list.clean_kol_dataframe 整張表"""
+    return lambda: clean_kol_list.clean_kol_dataframe(data['raw'])
+
+def stage_dedup(data):
+    """DedupIndex 逐筆加入清洗後的名單"""
+    def run():
+        index = DedupIndex()
+        for kol in data['kols']:
+            index.add(kol)
+    return run
+
+def stage_match(data):
+    """KolMatcher 建索引並對應所有圖片"""
+    return lambda: KolMatcher(data['kols']).match_all(data['images'])
+
+def stage_match_images(data):
+    """regenerate_html.match_images 完整流程（讀 JSON、列出頭像資料夾、比對）"""
+    return lambda: regenerate_html.match_images()
+
+def stage_card_html(data):
+    """regenerate_html.generate_card_html 產生所有卡片"""
+    return lambda: ''.join(regenerate_html.generate_card_html(kol) for kol in data['cards'])
+
+def stage_search_index(data):
+    """search_index.build_search_index（虛擬化版面的搜尋索引）"""
+    documents = [[kol['display_name'], kol['clean_name']] for kol in data['cards']]
+    return lambda: build_search_index(documents)
+
+STAGES = {
+    'clean_scalar': stage_clean_scalar,
+    'clean_vectorized': stage_clean_vectorized,
+    'dedup': stage_dedup,
+    'match': stage_match,
+    'match_images': stage_match_images,
+    'card_html': stage_card_html,
+    'search_index': stage_search_index,
+}
+
+@contextlib.contextmanager
+def synthetic_dataset(n):
+    """產生 n 列原始資料、清洗後名單與頭像資料夾（暫存），並讓 regenerate_html 指向它們"""
+    raw = make_raw_frame(n)
+    kols = clean_kol_list.clean_kol_dataframe(raw).to_dict('records')
+    images = image_names(kols)
+    thumbs = {'webp': ('thumbnails/1-200.webp', 'thumbnails/1-400.webp'),
+              'jpg': ('thumbnails/1-200.jpg', 'thumbnails/1-400.jpg')}
+    cards = [
+        {'display_name': kol['display_name'], 'clean_name': kol['name'],
+         'path': f"kol_avatars/{safe_filename(kol['name'])}.jpg",
+         'platform': ('Instagram', 'Facebook', 'YouTube')[i % 3],
+         'thumbs': thumbs if i % 2 else None}
+        for i, kol in enumerate(kols)
+    ]
+    with tempfile.TemporaryDirectory(prefix='kol-bench-cpu-') as workdir:
+        avatar_dir = os.path.join(workdir, 'kol_avatars')
+        os.makedirs(avatar_dir)
+        for name in images:
+            open(os.path.join(avatar_dir, f"{name}.jpg"), 'wb').close()
+        kol_file = os.path.join(workdir, 'kol_list_cleaned.json')
+        with open(kol_file, 'w', encoding='utf-8') as f:
+            json.dump(kols, f, ensure_ascii=False)
+        saved = regenerate_html.DOWNLOAD_DIR, regenerate_html.KOL_DATA_FILE
+        regenerate_html.DOWNLOAD_DIR, regenerate_html.KOL_DATA_FILE = avatar_dir, kol_file
+        try:
+            yield {'raw': raw, 'kols': kols, 'images': images, 'cards': cards}
+        finally:
+            regenerate_html.DOWNLOAD_DIR, regenerate_html.KOL_DATA_FILE = saved
+
+def best_time(fn):
+    """重複執行到累計 MIN_REPEAT_SECONDS（或 MAX_REPEATS 次），回傳最快一次的秒數"""
+    best = None
+    total = 0.0
+    for _ in range(MAX_REPEATS):
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        total += elapsed
+        if total >= MIN_REPEAT_SECONDS:
+            break
+    return best
+
+# ==================== 基準 ====================
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='KOL 名單 CPU 微效能測試')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='原始名單列數，以逗號分隔')
+    parser.add_argument('--stages', default=','.join(STAGES), help='要量測的階段')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基準檔路徑')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次結果存成基準')
+    args = parser.parse_args()
+
+    stages = args.stages.split(',')
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"未知的階段: {', '.join(unknown)}（可用: {', '.join(STAGES)}）")
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    base_results = baseline['results'] if baseline else {}
+
+    print(f"{'階段':<18} {'N':>7} {'筆數':>7} {'總耗時 ms':>11} {'µs/筆':>9} {'基準比':>7}")
+    results = {}
+    regressions = []
+    for n in (int(s) for s in args.sizes.split(',')):
+        with synthetic_dataset(n) as data:
+            for name in stages:
+                seconds = best_time(STAGES[name](data))
+                records = n if name.startswith('clean') else len(data['kols'])
+                results.setdefault(name, {})[str(n)] = seconds
+                previous = base_results.get(name, {}).get(str(n))
+                ratio = seconds / previous if previous else None
+                flag = ''
+                if ratio and ratio > REGRESSION_RATIO:
+                    flag = '  ← 變慢'
+                    regressions.append((name, n, ratio))
+                ratio_text = f"{ratio:>6.2f}x" if ratio else f"{'-':>7}"
+                print(f"{name:<18} {n:>7} {records:>7} {seconds * 1000:>11.2f} "
+                      f"{seconds / max(records, 1) * 1e6:>9.2f} {ratio_text}{flag}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\n基準已儲存至: {args.baseline}")
+    elif baseline:
+        print(f"\n與基準比較（{baseline['created_at']}，Python {baseline['python']}）："
+              f"{len(regressions)} 項比基準慢超過 {REGRESSION_RATIO:.1f} 倍")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
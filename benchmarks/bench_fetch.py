@@ -0,0 +1,186 @@
+"""
+頭像抓取流程的離線效能測試
+啟動本機假平台伺服器，產生 N 位 KOL（Instagram / Facebook / YouTube 輪流），
+在獨立的子行程與暫存資料夾中執行 kol_avatar_fetcher / kol_avatar_selenium 的 main()，
+回報吞吐量（KOL/s）與每位 KOL 耗時的 p50 / p95 / p99，不需要連到真實網站
+
+用法:
+    python benchmarks/bench_fetch.py --sizes 100,1000,10000 --latency-ms 20 --throttle 0.01
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+import contextlib
+import subprocess
+import urllib.request
+
+from fake_platform_server import FakePlatformServer, rewrite_url
+
+# --- 設定區 ---
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = (100, 1000, 10000)
+FETCHERS = ('kol_avatar_fetcher', 'kol_avatar_selenium')
+FAST_RATE = (10000.0, 10000)    # 不使用真實限流設定時，各平台 / 主機的 (每秒請求數, 突發容量)
+
+def make_kols(n):
+    """產生 n 位 KOL，社群連結依序為 Instagram、Facebook 帳號、Facebook 數字 ID、YouTube"""
+    links = (
+        lambda i: f"https://www.instagram.com/bench_ig_{i}/",
+        lambda i: f"https://www.facebook.com/bench.fb.{i}",
+        lambda i: f"https://www.facebook.com/profile.php?id={100000 + i}",
+        lambda i: f"https://www.youtube.com/@bench_yt_{i}",
+    )
+    return [
+        {'name': f"測試KOL{i}", 'display_name': f"測試KOL {i}", 'social_link': links[i % len(links)](i), 'email': ''}
+        for i in range(n)
+    ]
+
+# ==================== 子行程 ====================
+
+class RewritingClient:
+    """包住 http_client 的共用 client，把所有請求導向假伺服器"""
+
+    def __init__(self, inner, base_url):
+        self.inner = inner
+        self.base_url = base_url
+
+    def get(self, url, **kwargs):
+        return self.inner.get(rewrite_url(url, self.base_url), **kwargs)
+
+    def close(self):
+        self.inner.close()
+
+def server_requests(base_url):
+    """假伺服器自上次查詢以來的各類請求數"""
+    with urllib.request.urlopen(f"{base_url}/__stats") as response:
+        return json.loads(response.read())
+
+def install_client(base_url):
+    import http_client
+    http_client.close()
+    http_client._client = RewritingClient(http_client.get_client(), base_url)
+
+def prepare_fetcher(name, base_url, real_rates):
+    """載入抓取模組並改成只連假伺服器（instaloader 會直接連 Instagram，移除不用）"""
+    import rate_limiter
+    if not real_rates:
+        rates = {platform: FAST_RATE for platform in rate_limiter.PLATFORM_RATES}
+        rate_limiter._rate_limiter = rate_limiter.RateLimiter(platform_rates=rates, host_rate=FAST_RATE)
+    module = importlib.import_module(name)
+    tiers = module.REGISTRY.get('Instagram').tiers
+    tiers.strategies = [s for s in tiers.strategies if s.name != 'instaloader']
+    if hasattr(module, 'fetch_facebook_avatar_selenium'):
+        from tiered_resolver import Strategy
+        fetch = module.fetch_facebook_avatar_selenium
+        module.REGISTRY.add_strategy('Facebook', Strategy(
+            'selenium', lambda url: fetch(rewrite_url(url, base_url)), cost=10,
+        ))
+    return module
+
+def run_worker(config):
+    """在目前資料夾執行一次（或 warm 時兩次）main()，回傳每次的結果"""
+    sys.path.insert(0, REPO_DIR)
+    module = prepare_fetcher(config['fetcher'], config['base_url'], config['real_rates'])
+    import metrics
+
+    kol_file = os.path.abspath('bench_kols.json')
+    with open(kol_file, 'w', encoding='utf-8') as f:
+        json.dump(make_kols(config['size']), f, ensure_ascii=False)
+    module.KOL_DATA_FILE = kol_file
+
+    runs = []
+    server_requests(config['base_url'])
+    for _ in range(config['runs']):
+        install_client(config['base_url'])
+        start = time.perf_counter()
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            if config['fetcher'] == 'kol_avatar_fetcher':
+                results = module.main(concurrent=True)
+            else:
+                results = module.main()
+        elapsed = time.perf_counter() - start
+        stages = {
+            stage: {'count': count, 'p50': p50, 'p95': p95, 'p99': p99, 'bytes': size, 'errors': errors}
+            for platform, stage, count, p50, p95, p99, size, errors in metrics.get_metrics().summary()
+            if platform == 'all'
+        }
+        runs.append({
+            'seconds': elapsed, 'ok': len(results), 'stages': stages,
+            'server_requests': server_requests(config['base_url']),
+        })
+    return runs
+
+# ==================== 主程序 ====================
+
+def run_child(fetcher, size, server, args):
+    config = {
+        'fetcher': fetcher,
+        'size': size,
+        'base_url': server.base_url,
+        'real_rates': args.real_rates,
+        'runs': 2 if args.warm else 1,
+    }
+    with tempfile.TemporaryDirectory(prefix='kol-bench-') as workdir:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config)],
+            cwd=workdir, capture_output=True, text=True, encoding='utf-8',
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{fetcher} N={size} 執行失敗:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def format_ms(value):
+    return f"{value * 1000:8.1f}" if value is not None else f"{'-':>8}"
+
+def main():
+    parser = argparse.ArgumentParser(description='KOL 頭像抓取離線效能測試')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='KOL 數量，以逗號分隔')
+    parser.add_argument('--fetchers', default=','.join(FETCHERS), help='要測試的抓取模組')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='假伺服器每個請求的延遲')
+    parser.add_argument('--throttle', type=float, default=0.0, help='回傳 429 的比例')
+    parser.add_argument('--image-kb', type=int, default=40, help='頭像圖片大小 (KB)')
+    parser.add_argument('--fb-script-only', type=float, default=0.0,
+                        help='Facebook 頁面只有 profilePicLarge（需要瀏覽器）的比例')
+    parser.add_argument('--real-rates', action='store_true', help='使用 rate_limiter 的真實限流設定')
+    parser.add_argument('--warm', action='store_true', help='同一資料夾再跑一次，測量快取命中時的速度')
+    parser.add_argument('--output', help='把結果另存為 JSON')
+    args = parser.parse_args()
+
+    server = FakePlatformServer(
+        latency=args.latency_ms / 1000, throttle_rate=args.throttle,
+        image_bytes=args.image_kb * 1024, fb_script_only_rate=args.fb_script_only,
+    ).start()
+    print(f"假平台伺服器: {server.base_url}")
+    print(f"{'模組':<22} {'N':>6} {'run':<5} {'秒':>8} {'KOL/s':>8} {'成功':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'頁面':>7} {'圖片':>7} {'429':>5}")
+    report = []
+    try:
+        for fetcher in args.fetchers.split(','):
+            for size in (int(s) for s in args.sizes.split(',')):
+                runs = run_child(fetcher, size, server, args)
+                for label, run in zip(('cold', 'warm'), runs):
+                    kol = run['stages'].get('kol', {})
+                    counts = run['server_requests']
+                    print(f"{fetcher:<22} {size:>6} {label:<5} {run['seconds']:>8.2f} "
+                          f"{size / run['seconds']:>8.1f} {run['ok']:>6} "
+                          f"{format_ms(kol.get('p50'))} {format_ms(kol.get('p95'))} {format_ms(kol.get('p99'))} "
+                          f"{counts.get('page', 0):>7} {counts.get('image', 0):>7} {counts.get('throttled', 0):>5}")
+                    report.append({'fetcher': fetcher, 'size': size, 'run': label, **run})
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存至: {args.output}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--worker':
+        print(json.dumps(run_worker(json.loads(sys.argv[2]))))
+    else:
+        main()
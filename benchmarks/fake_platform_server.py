@@ -0,0 +1,160 @@
+"""
+本機假社群平台伺服器（效能測試用）
+網址格式為 http://127.0.0.1:<port>/<原本的主機>/<原本的路徑>，依主機回傳：
+  www.instagram.com/<帳號>/           含 og:image 的個人頁面
+  www.facebook.com/<ID>               含 og:image，或只在 script 中有 profilePicLarge（需要瀏覽器）
+  graph.facebook.com/<ID>/picture     302 轉址到 CDN 圖片
+  www.youtube.com/@<頻道>             含 "avatar":{"thumbnails" 的頻道頁
+  *.cdninstagram.com / *.fbcdn.net / yt3.ggpht.com   指定大小的 PNG（每個路徑內容不同）
+可設定每個請求的延遲與回傳 429 的比例；/__stats 回傳各類請求數並歸零
+"""
+
+import re
+import json
+import time
+import zlib
+import random
+import struct
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# --- 設定區 ---
+IMAGE_BYTES = 40 * 1024     # 頭像圖片大小
+IMAGE_SIDE = 16             # 圖片邊長（像素內容依路徑產生，dHash 不會互相重複）
+LATENCY = 0.0               # 每個請求的延遲（秒）
+THROTTLE_RATE = 0.0         # 回傳 429 的比例
+FB_SCRIPT_ONLY_RATE = 0.0   # Facebook 頁面只有 profilePicLarge、沒有 og:image 的比例
+
+CDN_HOSTS = ('cdninstagram.com', 'fbcdn.net', 'ggpht.com')
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def synthetic_png(seed, size=IMAGE_BYTES, side=IMAGE_SIDE):
+    """以 seed 產生灰階雜訊 PNG，並用 ancillary chunk 補到約 size bytes"""
+    rng = random.Random(seed)
+    rows = b''.join(b'\x00' + bytes(rng.randrange(256) for _ in range(side)) for _ in range(side))
+    head = b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', side, side, 8, 0, 0, 0, 0))
+    body = _png_chunk(b'IDAT', zlib.compress(rows)) + _png_chunk(b'IEND', b'')
+    padding = max(0, size - len(head) - len(body) - 12)
+    return head + _png_chunk(b'fiLl', b'\x00' * padding) + body
+
+def is_script_only(fb_id, rate):
+    """依 ID 決定該 Facebook 頁面是否只有 profilePicLarge（同一個 ID 每次結果相同）"""
+    digest = hashlib.sha256(fb_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') / 2 ** 32 < rate
+
+class FakePlatformHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, meta='', script=''):
+        html = f'<html><head>{meta}</head><body><script>{script}</script></body></html>'
+        self._send(200, html.encode('utf-8'))
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        if parts.path == '/__stats':
+            # 各類請求數（取得後歸零），供測試程式分段統計
+            self._send(200, json.dumps(server.reset_counts()).encode('utf-8'), 'application/json')
+            return
+        host, _, path = parts.path.lstrip('/').partition('/')
+        kind = 'image' if host.endswith(CDN_HOSTS) else 'page'
+        server.count(kind)
+        if server.latency:
+            time.sleep(server.latency)
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            server.count('throttled')
+            self._send(429, headers={'Retry-After': '1'})
+            return
+
+        if kind == 'image':
+            self._send(200, synthetic_png(f"{host}/{path}", server.image_bytes), 'image/png')
+        elif host.endswith('instagram.com'):
+            user = path.strip('/')
+            image = f"https://scontent.cdninstagram.com/v/{user}.png"
+            self._page(meta=f'<meta property="og:image" content="{image}">')
+        elif host == 'graph.facebook.com':
+            fb_id = path.split('/')[0]
+            location = f"{server.base_url}/scontent.xx.fbcdn.net/v/{fb_id}.png"
+            self._send(302, headers={'Location': location})
+        elif host.endswith('facebook.com'):
+            fb_id = parse_qs(parts.query).get('id', [path.strip('/')])[0]
+            image = f"https://scontent.xx.fbcdn.net/v/{fb_id}.png"
+            if is_script_only(fb_id, server.fb_script_only_rate):
+                escaped = image.replace('/', '\\/')
+                self._page(script=f'var data = {{"profilePicLarge":{{"uri":"{escaped}"}}}};')
+            else:
+                self._page(meta=f'<meta property="og:image" content="{image}">')
+        elif host.endswith('youtube.com'):
+            channel = re.sub(r'^(@|channel/|c/|user/)', '', path.strip('/'))
+            image = f"https://yt3.ggpht.com/{channel}.png"
+            self._page(script=f'var ytInitialData = {{"avatar":{{"thumbnails":[{{"url":"{image}"}}]}}}};')
+        else:
+            self._send(404)
+
+class FakePlatformServer(ThreadingHTTPServer):
+    """在背景 thread 執行的假平台伺服器，並統計各類請求數"""
+
+    daemon_threads = True
+
+    def __init__(self, latency=LATENCY, throttle_rate=THROTTLE_RATE,
+                 image_bytes=IMAGE_BYTES, fb_script_only_rate=FB_SCRIPT_ONLY_RATE):
+        super().__init__(('127.0.0.1', 0), FakePlatformHandler)
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.image_bytes = image_bytes
+        self.fb_script_only_rate = fb_script_only_rate
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+        self.thread = None
+
+    def count(self, kind):
+        with self.counts_lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def reset_counts(self):
+        with self.counts_lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='fake-platform', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def rewrite_url(url, base_url):
+    """把真實平台網址改寫成指向假伺服器的網址；已經指向假伺服器的網址不變"""
+    if url.startswith(base_url):
+        return url
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ''
+    return f"{base_url}/{parts.hostname}{parts.path}{query}"
+
+if __name__ == "__main__":
+    server = FakePlatformServer().start()
+    print(f"假平台伺服器執行中: {server.base_url}（Ctrl+C 結束）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
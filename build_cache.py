@@ -0,0 +1,70 @@
+"""
+index.html 的增量建置快取
+每張卡片的 HTML 片段以 KOL 紀錄（含圖片路徑與縮圖路徑）的 hash 為 key 保存，輸入沒變的卡片直接沿用上次的片段；
+卡片只引用圖片路徑、不內嵌圖片內容，縮圖檔名已含原圖 hash，因此不必另外計算圖片 hash；
+整頁輸出與上次相同時不重寫檔案
+"""
+
+import os
+import json
+import hashlib
+
+from avatar_store import atomic_write
+
+# --- 設定區 ---
+BUILD_CACHE_FILE = "build_cache.json"
+TEMPLATE_VERSION = 2    # 修改卡片樣板時遞增，讓所有片段重新產生
+
+class BuildCache:
+    """卡片片段與上次輸出的快取；enabled=False 時全部重新產生"""
+
+    def __init__(self, path=BUILD_CACHE_FILE, enabled=True):
+        self.path = path
+        data = self._load() if enabled else {}
+        if data.get('version') != TEMPLATE_VERSION:
+            data = {}
+        self.fragments = data.get('fragments', {})
+        self.outputs = data.get('outputs', {})
+        self.used = {}
+        self.rendered = 0
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def fragment(self, kol, render):
+        """回傳卡片 HTML；KOL 紀錄沒變時沿用快取的片段"""
+        record = json.dumps(kol, ensure_ascii=False, sort_keys=True)
+        key = hashlib.sha256(record.encode('utf-8')).hexdigest()
+        html = self.fragments.get(key)
+        if html is None:
+            html = render(kol)
+            self.rendered += 1
+        self.used[key] = html
+        return html
+
+    def write_if_changed(self, path, content):
+        """內容與上次輸出相同且檔案未被改動時略過寫入，回傳是否有寫檔"""
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        previous = self.outputs.get(path)
+        if previous and previous['sha256'] == digest and os.path.exists(path):
+            stat = os.stat(path)
+            if stat.st_size == previous['size'] and stat.st_mtime == previous['mtime']:
+                return False
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        stat = os.stat(path)
+        self.outputs[path] = {'sha256': digest, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        return True
+
+    def save(self):
+        """只保留本次用到的片段（本次沒有產生卡片片段時保留原有片段）"""
+        data = {
+            'version': TEMPLATE_VERSION,
+            'fragments': self.used or self.fragments,
+            'outputs': self.outputs,
+        }
+        atomic_write(self.path, json.dumps(data, ensure_ascii=False).encode('utf-8'))
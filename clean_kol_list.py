@@ -5,10 +5,32 @@ KOL 名單資料清洗腳本
 
 import pandas as pd
 import re
+import sys
 import json
+import textwrap
 
-# 讀取 Excel
-df = pd.read_excel(r'd:\google antigravity\kolphoto\kol_list_booklunch.xlsx', sheet_name='kol_list')
+from kol_dedup import DedupIndex
+
+# --- 設定區 ---
+INPUT_FILE = r'd:\google antigravity\kolphoto\kol_list_booklunch.xlsx'
+SHEET_NAME = 'kol_list'
+OUTPUT_CSV = r'd:\google antigravity\kolphoto\kol_list_cleaned.csv'
+OUTPUT_JSON = r'd:\google antigravity\kolphoto\kol_list_cleaned.json'
+RAW_CSV_FILE = r'd:\google antigravity\kolphoto\kol_list_raw.csv'
+OUTPUT_JSONL = r'd:\google antigravity\kolphoto\kol_list_cleaned.jsonl'
+CHUNK_ROWS = 10000      # 串流模式每次清洗的列數
+
+# 清洗規則用到的正規表示式（只編譯一次）
+COMPANION_RE = re.compile(r'同行|同仁人')     # 同行人 / 同行者 / 同仁人 / 同行
+LEADING_SYMBOLS_RE = re.compile(r'^[^\w\u4e00-\u9fff]+')
+NAME_WITH_NICKNAME_RE = re.compile(r'^(.+?)\s*[\(（](.+?)[\)）]')
+NICKNAME_SUFFIX_RE = re.compile(r'(YT|yt|YouTube|FB|IG|粉絲|萬|大咖|,.*|，.*).*')
+BRACKET_SUFFIX_RE = re.compile(r'\s*[\(（].*')
+DAKA_SUFFIX_RE = re.compile(r'\s*大咖.*')
+DASH_SUFFIX_RE = re.compile(r'\s*-.*')
+
+def is_companion_name(raw_name):
+    return pd.notna(raw_name) and bool(COMPANION_RE.search(str(raw_name)))
 
 def extract_clean_name(raw_name, has_social_link=False):
     """
@@ -24,32 +46,31 @@ def extract_clean_name(raw_name, has_social_link=False):
     name = str(raw_name).strip()
     
     # 跳過同行人，除非有自己的社群連結
-    is_companion = '同行人' in name or '同行者' in name or '同仁人' in name or '同行' in name
-    if is_companion and not has_social_link:
+    if is_companion_name(name) and not has_social_link:
         return None
     
     # 移除特殊符號開頭 (如 🔖)
-    name = re.sub(r'^[^\w\u4e00-\u9fff]+', '', name)
+    name = LEADING_SYMBOLS_RE.sub('', name)
     
     # 提取括號前的名稱作為主要名稱
     # 例如: "朱麗禎 (超認真少年YT90.2萬)大咖" -> "朱麗禎" 或 "超認真少年"
     
     # 嘗試匹配模式: 真名 (暱稱)
-    match = re.match(r'^(.+?)\s*[\(（](.+?)[\)）]', name)
+    match = NAME_WITH_NICKNAME_RE.match(name)
     if match:
         real_name = match.group(1).strip()
         nickname = match.group(2).strip()
         # 移除暱稱中的額外資訊
-        nickname = re.sub(r'(YT|yt|YouTube|FB|IG|粉絲|萬|大咖|,.*|，.*).*', '', nickname).strip()
+        nickname = NICKNAME_SUFFIX_RE.sub('', nickname).strip()
         # 如果暱稱更有辨識度，優先使用暱稱
         if len(nickname) > 1 and not nickname.isdigit():
             return nickname
         return real_name
     
     # 移除後綴資訊
-    name = re.sub(r'\s*[\(（].*', '', name)
-    name = re.sub(r'\s*大咖.*', '', name)
-    name = re.sub(r'\s*-.*', '', name)
+    name = BRACKET_SUFFIX_RE.sub('', name)
+    name = DAKA_SUFFIX_RE.sub('', name)
+    name = DASH_SUFFIX_RE.sub('', name)
     
     return name.strip() if name.strip() else None
 
@@ -62,67 +83,172 @@ def get_display_name(row):
     if pd.notna(social_name) and str(social_name).strip():
         # 清理社群名稱
         social = str(social_name).strip()
-        social = re.sub(r'\s*[\(（].*', '', social)  # 移除括號
+        social = BRACKET_SUFFIX_RE.sub('', social)  # 移除括號
         if social:
             return social
     
     return extract_clean_name(row.get('姓名', ''))
 
-# 處理資料
-kol_list = []
-seen_names = set()
+def text_column(df, column):
+    """取出欄位並轉成去頭尾空白的字串（缺值與缺欄位都視為空字串）"""
+    if column not in df:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].where(df[column].notna(), '').astype(str).str.strip()
+
+def clean_names(raw_names):
+    """extract_clean_name 的向量化版本（不含同行人判斷），無法取得名稱時為 None"""
+    names = raw_names.str.replace(LEADING_SYMBOLS_RE, '', regex=True)
+
+    # 真名 (暱稱)：暱稱去掉額外資訊後夠長且不是純數字就用暱稱
+    parts = names.str.extract(NAME_WITH_NICKNAME_RE)
+    real_names = parts[0].str.strip()
+    nicknames = parts[1].str.strip().str.replace(NICKNAME_SUFFIX_RE, '', regex=True).str.strip()
+    use_nickname = (nicknames.str.len() > 1) & ~nicknames.str.isdigit().astype(bool)
+    bracketed = nicknames.where(use_nickname, real_names)
+
+    # 其他名稱移除後綴資訊
+    plain = (names.str.replace(BRACKET_SUFFIX_RE, '', regex=True)
+                  .str.replace(DAKA_SUFFIX_RE, '', regex=True)
+                  .str.replace(DASH_SUFFIX_RE, '', regex=True)
+                  .str.strip())
+
+    result = bracketed.where(parts[0].notna(), plain)
+    return result.where(result != '', None)
+
+def clean_kol_dataframe(df):
+    """
+    以 pandas 向量化運算清洗整張表，結果與逐列呼叫 extract_clean_name / get_display_name 相同
+    回傳欄位為 name / display_name / social_link / email 的 DataFrame（已依 name 去重，保留第一筆）
+    """
+    raw_names = text_column(df, '姓名')
+    social_links = text_column(df, '主要社群')
+    emails = text_column(df, 'Email信箱/LINE')
 
-for idx, row in df.iterrows():
-    raw_name = row.get('姓名', '')
-    
-    # 取得社群連結
-    social_link = row.get('主要社群', '')
-    has_social_link = pd.notna(social_link) and str(social_link).strip() and str(social_link).strip().startswith('http')
-    
     # 同行人如果有自己的社群連結，也視為 KOL
-    is_companion = pd.notna(raw_name) and ('同行人' in str(raw_name) or '同行者' in str(raw_name) or '同仁人' in str(raw_name) or '同行' in str(raw_name))
-    if is_companion and not has_social_link:
-        continue
-    
-    clean_name = extract_clean_name(raw_name, has_social_link)
-    display_name = get_display_name(row)
-    
-    if clean_name and clean_name not in seen_names:
-        seen_names.add(clean_name)
-        
-        # 取得社群連結
-        social_link = row.get('主要社群', '')
-        social_link = social_link if pd.notna(social_link) else ''
-        
-        # 取得 Email
-        email = row.get('Email信箱/LINE', '')
-        email = email if pd.notna(email) else ''
-        
-        kol_list.append({
-            'name': clean_name,
-            'display_name': display_name if display_name else clean_name,
-            'social_link': str(social_link).strip(),
-            'email': str(email).strip()
-        })
-
-print(f"總共清洗出 {len(kol_list)} 位 KOL")
-print("\n前 20 位 KOL 名單:")
-for i, kol in enumerate(kol_list[:20], 1):
-    print(f"{i:3}. {kol['name']}")
-
-# 輸出為 Python 可用的格式
-print("\n\n" + "="*50)
-print("Python 可用的 KOL 名稱列表:")
-print("="*50)
-kol_names = [kol['name'] for kol in kol_list]
-print(f"\nKOL_NAMES = {json.dumps(kol_names, ensure_ascii=False, indent=4)}")
-
-# 儲存清洗後的資料
-output_df = pd.DataFrame(kol_list)
-output_df.to_csv(r'd:\google antigravity\kolphoto\kol_list_cleaned.csv', index=False, encoding='utf-8-sig')
-print(f"\n清洗後的資料已儲存至: kol_list_cleaned.csv")
-
-# 另存為 JSON 格式
-with open(r'd:\google antigravity\kolphoto\kol_list_cleaned.json', 'w', encoding='utf-8') as f:
-    json.dump(kol_list, f, ensure_ascii=False, indent=2)
-print(f"JSON 格式已儲存至: kol_list_cleaned.json")
+    has_social_link = social_links.str.startswith('http')
+    is_companion = raw_names.str.contains(COMPANION_RE, regex=True)
+    keep = ~is_companion | has_social_link
+
+    names = clean_names(raw_names)
+    socials = text_column(df, '社群名稱').str.replace(BRACKET_SUFFIX_RE, '', regex=True)
+    display_names = socials.where(socials != '', names)
+
+    cleaned = pd.DataFrame({
+        'name': names,
+        'display_name': display_names,
+        'social_link': social_links,
+        'email': emails,
+    })
+    cleaned = cleaned[keep & names.notna()]
+    return cleaned.drop_duplicates(subset='name', keep='first').reset_index(drop=True)
+
+def drop_fuzzy_duplicates(frame, index):
+    """以 DedupIndex 移除與先前紀錄重複的列（名稱寫法不同、同一社群帳號等），並列出被合併的名稱"""
+    keep = []
+    for kol in frame.to_dict('records'):
+        duplicate = index.add(kol)
+        if duplicate is not None:
+            print(f"  [重複] {kol['name']} → {duplicate['name']}")
+        keep.append(duplicate is None)
+    return frame[keep]
+
+# ==================== 串流模式 ====================
+
+def iter_xlsx_chunks(path, sheet_name=SHEET_NAME, chunk_rows=CHUNK_ROWS):
+    """以 openpyxl 唯讀模式逐列讀取 Excel，每 chunk_rows 列產生一個 DataFrame"""
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = [str(cell) if cell is not None else '' for cell in next(rows, ())]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+def iter_csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    """分批讀取 CSV（例如 kol_list_raw.csv）"""
+    yield from pd.read_csv(path, chunksize=chunk_rows, dtype=str, encoding='utf-8-sig')
+
+def iter_clean_chunks(chunks):
+    """逐批清洗並跨批次去重（只保留去重索引，不保留整份名單）"""
+    index = DedupIndex()
+    for chunk in chunks:
+        cleaned = drop_fuzzy_duplicates(clean_kol_dataframe(chunk), index)
+        if len(cleaned):
+            yield cleaned
+
+def write_streaming(frames, csv_path=OUTPUT_CSV, json_path=OUTPUT_JSON, jsonl_path=OUTPUT_JSONL):
+    """
+    邊清洗邊寫出 CSV、JSON 與 JSONL，回傳 (總筆數, 前 20 個名稱)
+    JSON 逐筆寫出，格式與 json.dump(..., indent=2) 相同，下游腳本不需修改
+    """
+    count = 0
+    first_names = []
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as csv_file, \
+         open(json_path, 'w', encoding='utf-8') as json_file, \
+         open(jsonl_path, 'w', encoding='utf-8') as jsonl_file:
+        json_file.write('[')
+        for frame in frames:
+            frame.to_csv(csv_file, index=False, header=(count == 0))
+            for kol in frame.to_dict('records'):
+                item = textwrap.indent(json.dumps(kol, ensure_ascii=False, indent=2), '  ')
+                json_file.write((',\n' if count else '\n') + item)
+                jsonl_file.write(json.dumps(kol, ensure_ascii=False) + '\n')
+                if len(first_names) < 20:
+                    first_names.append(kol['name'])
+                count += 1
+        json_file.write('\n]' if count else ']')
+    return count, first_names
+
+def main_streaming(from_csv=False):
+    """串流模式：記憶體用量不隨原始資料大小成長（只保留去重索引）"""
+    chunks = iter_csv_chunks(RAW_CSV_FILE) if from_csv else iter_xlsx_chunks(INPUT_FILE)
+    count, first_names = write_streaming(iter_clean_chunks(chunks))
+
+    print(f"總共清洗出 {count} 位 KOL")
+    print("\n前 20 位 KOL 名單:")
+    for i, name in enumerate(first_names, 1):
+        print(f"{i:3}. {name}")
+    print(f"\n清洗後的資料已儲存至: kol_list_cleaned.csv / kol_list_cleaned.json / kol_list_cleaned.jsonl")
+
+def main():
+    # 讀取 Excel
+    df = pd.read_excel(INPUT_FILE, sheet_name=SHEET_NAME)
+
+    # 處理資料
+    output_df = drop_fuzzy_duplicates(clean_kol_dataframe(df), DedupIndex())
+    kol_list = output_df.to_dict('records')
+
+    print(f"總共清洗出 {len(kol_list)} 位 KOL")
+    print("\n前 20 位 KOL 名單:")
+    for i, kol in enumerate(kol_list[:20], 1):
+        print(f"{i:3}. {kol['name']}")
+
+    # 輸出為 Python 可用的格式
+    print("\n\n" + "="*50)
+    print("Python 可用的 KOL 名稱列表:")
+    print("="*50)
+    kol_names = [kol['name'] for kol in kol_list]
+    print(f"\nKOL_NAMES = {json.dumps(kol_names, ensure_ascii=False, indent=4)}")
+
+    # 儲存清洗後的資料
+    output_df.to_csv(OUTPUT_CSV, index=False, encoding='utf-8-sig')
+    print(f"\n清洗後的資料已儲存至: kol_list_cleaned.csv")
+
+    # 另存為 JSON 格式
+    with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
+        json.dump(kol_list, f, ensure_ascii=False, indent=2)
+    print(f"JSON 格式已儲存至: kol_list_cleaned.json")
+
+if __name__ == "__main__":
+    if '--stream' in sys.argv:
+        main_streaming(from_csv='--csv' in sys.argv)
+    else:
+        main()
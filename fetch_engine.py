@@ -0,0 +1,44 @@
+"""
+KOL 頭像並行抓取引擎
+以有界 worker pool 同時處理多位 KOL，並讓 Instagram / Facebook / YouTube 各自維持同時連線上限
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from social_links import detect_platform
+
+# 各平台同時處理的 KOL 數上限（未列出的平台使用 DEFAULT_PLATFORM_LIMIT）
+PLATFORM_LIMITS = {
+    'Instagram': 2,
+    'Facebook': 4,
+    'YouTube': 4,
+}
+DEFAULT_PLATFORM_LIMIT = 4
+
+# 並行輸出時避免多個 KOL 的訊息交錯
+print_lock = threading.Lock()
+
+def run_concurrent(items, worker, platform_of, limits=None):
+    """
+    並行執行 worker(item)，回傳與 items 順序相同的結果列表
+    每個平台各有一個獨立的 worker pool，大小即該平台的上限，
+    因此某平台排隊時不會卡住其他平台的 KOL
+    """
+    limits = dict(PLATFORM_LIMITS if limits is None else limits)
+    pools = {}
+    futures = []
+    try:
+        for item in items:
+            platform = platform_of(item)
+            if platform not in pools:
+                size = limits.get(platform, DEFAULT_PLATFORM_LIMIT)
+                pools[platform] = ThreadPoolExecutor(
+                    max_workers=max(1, size),
+                    thread_name_prefix=f"fetch-{platform or 'none'}",
+                )
+            futures.append(pools[platform].submit(worker, item))
+        return [future.result() for future in futures]
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
@@ -0,0 +1,139 @@
+"""
+共用 HTTP 連線層
+所有抓取模組共用同一組 keep-alive 連線池（每個主機各自保留連線），
+減少每位 KOL 的 TCP/TLS 交握次數；有安裝 httpx 與 h2 時改走 HTTP/2
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from rate_limiter import get_rate_limiter, is_throttled
+
+# --- 設定區 ---
+POOL_CONNECTIONS = 16   # 保留連線池的主機數（fbcdn、ggpht、cdninstagram...）
+POOL_MAXSIZE = 8        # 每個主機最多保留的 keep-alive 連線數
+USE_HTTP2 = True        # 可用時優先使用 HTTP/2
+THROTTLE_RETRIES = 2    # 被限流（429/503）時，等 Retry-After 過後最多再試幾次
+
+# 請求 headers（模擬瀏覽器）
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+class Http2Response:
+    """把 httpx 回應包成與 requests.Response 相同的介面"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def content(self):
+        return self._response.content
+
+    @property
+    def text(self):
+        return self._response.text
+
+    def iter_content(self, chunk_size=65536):
+        return self._response.iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+class Http2Client:
+    """httpx 版本的共用 client，同一主機的請求在單一 HTTP/2 連線上多工"""
+
+    def __init__(self, pool_connections, pool_maxsize):
+        import httpx
+        limits = httpx.Limits(
+            max_connections=pool_connections * pool_maxsize,
+            max_keepalive_connections=pool_connections * pool_maxsize,
+        )
+        self._client = httpx.Client(http2=True, headers=HEADERS, limits=limits)
+
+    def get(self, url, headers=None, timeout=None, allow_redirects=True, stream=False):
+        request = self._client.build_request('GET', url, headers=headers, timeout=timeout)
+        response = self._client.send(request, stream=stream, follow_redirects=allow_redirects)
+        return Http2Response(response)
+
+    def close(self):
+        self._client.close()
+
+def _http2_available():
+    try:
+        import httpx
+        import h2
+        return True
+    except ImportError:
+        return False
+
+def _build_session(pool_connections, pool_maxsize):
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def configure(pool_connections=None, pool_maxsize=None, http2=None):
+    """調整連線池大小或 HTTP/2 開關，下一次請求時以新設定重建 client"""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, USE_HTTP2
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if http2 is not None:
+        USE_HTTP2 = http2
+    close()
+
+def get_client():
+    """取得共用 client（首次呼叫時建立）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if USE_HTTP2 and _http2_available():
+                    _client = Http2Client(POOL_CONNECTIONS, POOL_MAXSIZE)
+                else:
+                    _client = _build_session(POOL_CONNECTIONS, POOL_MAXSIZE)
+    return _client
+
+def get(url, headers=None, timeout=None, allow_redirects=True, stream=False, platform=None):
+    """
+    透過共用連線池發出 GET 請求，參數與 requests.get 相同
+    請求前先向 rate limiter 取得主機（及 platform）的 token，並回報回應狀態（也記到目前的 metrics span）；
+    被限流時 rate limiter 會暫停該 bucket 到 Retry-After 之後，再重新取得 token 重試，
+    最多重試 THROTTLE_RETRIES 次，仍被限流才把最後一次的回應交給呼叫端
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(THROTTLE_RETRIES + 1):
+        limiter.acquire(platform=platform, url=url)
+        response = get_client().get(
+            url, headers=headers, timeout=timeout,
+            allow_redirects=allow_redirects, stream=stream,
+        )
+        retry_after = response.headers.get('Retry-After')
+        limiter.report(response.status_code, platform=platform, url=url, retry_after=retry_after)
+        metrics.note_response(response.status_code)
+        if attempt == THROTTLE_RETRIES or not is_throttled(response.status_code, retry_after):
+            return response
+        response.close()
+
+def close():
+    """關閉共用 client 與其連線池"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
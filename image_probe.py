@@ -0,0 +1,94 @@
+"""
+圖片格式偵測
+只看檔案開頭的 magic bytes 判斷格式，不依賴伺服器給的 content-type，
+並可只從檔頭解析寬高（不需下載整張圖片）
+"""
+
+import struct
+
+# (magic bytes 在檔頭的位置, magic bytes, 副檔名)
+SIGNATURES = [
+    (0, b'\xff\xd8\xff', '.jpg'),
+    (0, b'\x89PNG\r\n\x1a\n', '.png'),
+    (0, b'GIF87a', '.gif'),
+    (0, b'GIF89a', '.gif'),
+    (8, b'WEBP', '.webp'),
+    (4, b'ftypavif', '.avif'),
+    (4, b'ftypavis', '.avif'),
+    (0, b'BM', '.bmp'),
+]
+
+# 判斷格式最少需要的檔頭長度
+SNIFF_BYTES = 16
+
+def sniff_image_type(head):
+    """依檔頭判斷圖片格式，回傳副檔名（如 '.jpg'），不是圖片則回傳 None"""
+    for offset, magic, ext in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if ext == '.webp' and not head.startswith(b'RIFF'):
+                continue
+            return ext
+    return None
+
+# 讀取尺寸最多需要的檔頭長度（JPEG 的 SOF 可能在 EXIF / ICC 區段之後）
+DIMENSION_PROBE_BYTES = 64 * 1024
+
+# 含寬高資訊的 JPEG SOF 標記（排除 DHT / JPG / DAC）
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def _jpeg_dimensions(head):
+    pos = 2
+    while pos + 9 <= len(head):
+        if head[pos] != 0xFF:
+            return None
+        marker = head[pos + 1]
+        if marker == 0xFF:     # 填充位元組
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack('>H', head[pos + 2:pos + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', head[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+def _webp_dimensions(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(head) >= 25:
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(head) >= 30:
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    return None
+
+def image_dimensions(head):
+    """
+    只依檔頭解析圖片寬高，回傳 (寬, 高)；格式不支援或檔頭不夠長時回傳 None
+    JPEG 需要讀到 SOF 區段，其餘格式前 32 bytes 即可
+    """
+    ext = sniff_image_type(head)
+    try:
+        if ext == '.png' and len(head) >= 24:
+            return struct.unpack('>II', head[16:24])
+        if ext == '.gif' and len(head) >= 10:
+            return struct.unpack('<HH', head[6:10])
+        if ext == '.bmp' and len(head) >= 26:
+            width, height = struct.unpack('<ii', head[18:26])
+            return width, abs(height)
+        if ext == '.webp':
+            return _webp_dimensions(head)
+        if ext == '.jpg':
+            return _jpeg_dimensions(head)
+        if ext == '.avif':
+            pos = head.find(b'ispe')
+            if pos >= 0 and len(head) >= pos + 16:
+                return struct.unpack('>II', head[pos + 8:pos + 16])
+    except struct.error:
+        pass
+    return None
@@ -0,0 +1,254 @@
+"""
+DuckDuckGo 圖片搜尋 fallback 服務
+每個 thread 各自建立一個 DDGS client（DDGS 不是 thread-safe）並在整個執行期間重複使用，多個查詢在 rate limiter 控制下並行送出；
+查詢結果（多個候選圖片）以 SQLite 快取並設有效期；下載前先依尺寸、比例與來源網域排序候選，
+下載失敗時直接改用下一個候選，不必重新搜尋
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+import http_client
+from http_client import HEADERS
+from image_probe import DIMENSION_PROBE_BYTES, image_dimensions
+from rate_limiter import get_rate_limiter
+from fetch_engine import run_concurrent
+
+# --- 設定區 ---
+SEARCH_CACHE_FILE = "search_cache.sqlite"
+SEARCH_CACHE_TTL = 3 * 24 * 3600    # 查詢結果快取有效期（秒）
+MAX_RESULTS = 5                     # 每次查詢保留的候選圖片數
+SEARCH_WORKERS = 3                  # 同時進行的查詢數（實際速率仍由 rate_limiter 控制）
+PLATFORM = 'DuckDuckGo'
+
+# 候選排序
+MIN_SIDE = 120                      # 短邊小於此值的圖片太模糊
+MAX_SIDE = 1600                     # 長邊超過此值多半是原圖 / 橫幅，下載成本高
+MAX_CANDIDATE_BYTES = 2 * 1024 * 1024
+PROBE_TOP = 3                       # 只對排名前幾的候選讀取檔頭確認尺寸
+# 頭像常見的 CDN 網域加分；書店 / 購物網站的圖多半是書封或商品圖，扣分
+PREFERRED_DOMAINS = ('fbcdn.net', 'cdninstagram.com', 'ggpht.com', 'ytimg.com', 'googleusercontent.com', 'twimg.com')
+PENALIZED_DOMAINS = ('books.com.tw', 'readmoo.com', 'kobo.com', 'amazon.', 'eslite.com', 'momoshop.com.tw', 'pchome.com.tw', 'shopee.')
+
+CONTENT_RANGE_TOTAL = re.compile(r'/(\d+)$')
+
+# 只保存之後會用到的欄位
+RESULT_FIELDS = ('image', 'thumbnail', 'url', 'source', 'title', 'width', 'height')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    query TEXT PRIMARY KEY,
+    results TEXT,
+    searched_at REAL
+)
+"""
+
+class SearchCache:
+    """查詢字串 → 候選圖片列表的 SQLite 快取（thread-safe）"""
+
+    def __init__(self, path=SEARCH_CACHE_FILE, ttl=SEARCH_CACHE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def get(self, query):
+        """有效期內的結果列表（找不到圖片時為空列表），沒有或已過期則回傳 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT results, searched_at FROM search_cache WHERE query = ?", (query,)
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, query, results):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO search_cache (query, results, searched_at) VALUES (?, ?, ?)",
+                (query, json.dumps(results, ensure_ascii=False), time.time()),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _host(url):
+    return (urlparse(url or '').hostname or '').lower()
+
+def candidate_score(result):
+    """
+    候選圖片的分數（越高越好）：接近正方形、尺寸適中、來自頭像 CDN 的優先
+    沒有尺寸資訊時給中間值
+    """
+    width, height = _to_int(result.get('width')), _to_int(result.get('height'))
+    if width and height:
+        short, long = sorted((width, height))
+        score = short / long
+        if short < MIN_SIDE:
+            score -= 0.5
+        elif long > MAX_SIDE:
+            score -= 0.3
+    else:
+        score = 0.5
+    size = result.get('bytes')
+    if size and size > MAX_CANDIDATE_BYTES:
+        score -= 0.5
+    hosts = (_host(result.get('image')), _host(result.get('url')))
+    if any(domain in host for host in hosts for domain in PREFERRED_DOMAINS):
+        score += 0.3
+    if any(domain in host for host in hosts for domain in PENALIZED_DOMAINS):
+        score -= 0.5
+    return score
+
+def probe_dimensions(url):
+    """
+    只下載檔頭（Range 請求，最多 DIMENSION_PROBE_BYTES）解析圖片寬高
+    回傳 ((寬, 高) 或 None, 檔案總大小或 None)；請求失敗時回傳 (None, None)
+    """
+    try:
+        response = http_client.get(
+            url, headers={**HEADERS, 'Range': f'bytes=0-{DIMENSION_PROBE_BYTES - 1}'},
+            timeout=5, stream=True,
+        )
+    except Exception:
+        return None, None
+    try:
+        if response.status_code not in (200, 206):
+            return None, None
+        match = CONTENT_RANGE_TOTAL.search(response.headers.get('Content-Range') or '')
+        if match:
+            total = int(match.group(1))
+        else:
+            total = _to_int(response.headers.get('Content-Length')) if response.status_code == 200 else None
+        head = b''
+        for chunk in response.iter_content(8192):
+            head += chunk
+            dimensions = image_dimensions(head)
+            if dimensions or len(head) >= DIMENSION_PROBE_BYTES:
+                return dimensions, total
+        return image_dimensions(head), total
+    except Exception:
+        return None, None
+    finally:
+        response.close()
+
+def rank_candidates(results, probe=probe_dimensions, probe_top=PROBE_TOP):
+    """
+    依搜尋結果附帶的寬高與來源網域排序候選，再讀取前 probe_top 名的檔頭確認實際尺寸與大小後重新排序
+    回傳新的列表（不修改原本的 dict）
+    """
+    ranked = sorted((dict(result) for result in results), key=candidate_score, reverse=True)
+    for result in ranked[:probe_top] if probe else ():
+        dimensions, total = probe(result['image'])
+        if dimensions:
+            result['width'], result['height'] = dimensions
+        if total:
+            result['bytes'] = total
+    return sorted(ranked, key=candidate_score, reverse=True)
+
+class ImageSearch:
+    """圖片搜尋服務：查詢快取共用，DDGS client 每個 thread 一個"""
+
+    def __init__(self, cache=None, max_results=MAX_RESULTS):
+        self.cache = cache or SearchCache()
+        self.max_results = max_results
+        self._local = threading.local()
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def _client(self):
+        """目前 thread 的 DDGS client（首次呼叫時建立）"""
+        ddgs = getattr(self._local, 'ddgs', None)
+        if ddgs is None:
+            from duckduckgo_search import DDGS
+            ddgs = DDGS()
+            self._local.ddgs = ddgs
+            with self._lock:
+                self._clients.append(ddgs)
+        return ddgs
+
+    def search(self, query):
+        """
+        回傳候選圖片列表（dict，含 image / width / height / source 等欄位）
+        優先使用快取；搜尋失敗時拋出例外且不寫入快取，下次會重新搜尋
+        """
+        cached = self.cache.get(query)
+        if cached is not None:
+            return cached
+        limiter = get_rate_limiter()
+        try:
+            limiter.acquire(platform=PLATFORM)
+            raw = self._client().images(query, max_results=self.max_results) or []
+        except Exception as e:
+            limiter.report_exception(e, platform=PLATFORM)
+            raise
+        limiter.report(200, platform=PLATFORM)
+        results = [
+            {field: item.get(field) for field in RESULT_FIELDS}
+            for item in raw if item.get('image')
+        ]
+        self.cache.put(query, results)
+        return results
+
+    def search_many(self, queries, workers=SEARCH_WORKERS):
+        """
+        並行搜尋多個查詢，回傳與 queries 順序相同的 (結果列表, 例外) 列表
+        單一查詢失敗不影響其他查詢
+        """
+        def run(query):
+            try:
+                return self.search(query), None
+            except Exception as e:
+                return [], e
+        return run_concurrent(queries, run, lambda query: PLATFORM, limits={PLATFORM: workers})
+
+    def download_best(self, results, download):
+        """排序候選後依序嘗試下載，回傳 (本地路徑, 圖片 URL)；全部失敗時回傳 (None, None)"""
+        for result in rank_candidates(results):
+            path = download(result['image'])
+            if path:
+                return path, result['image']
+        return None, None
+
+    def close(self):
+        with self._lock:
+            for ddgs in self._clients:
+                close = getattr(ddgs, '__exit__', None)
+                if close:
+                    close(None, None, None)
+            self._clients = []
+            self._local = threading.local()
+        self.cache.close()
+
+_image_search = None
+_image_search_lock = threading.Lock()
+
+def get_image_search():
+    """取得全域共用的 ImageSearch"""
+    global _image_search
+    if _image_search is None:
+        with _image_search_lock:
+            if _image_search is None:
+                _image_search = ImageSearch()
+    return _image_search
+
+def close_image_search():
+    """關閉所有 DDGS client 與快取連線"""
+    global _image_search
+    with _image_search_lock:
+        if _image_search is not None:
+            _image_search.close()
+            _image_search = None
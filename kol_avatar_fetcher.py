@@ -5,289 +5,203 @@ KOL 社群頭像抓取工具
 
 import os
 import re
+import sys
 import json
-import time
-import requests
-from urllib.parse import urlparse
 from datetime import datetime
 
+import http_client
+import metrics
+from image_search import close_image_search, get_image_search
+from avatar_store import get_avatar_store
+from avatar_download import download_image, download_screened
+from avatar_hash import PLACEHOLDER, get_avatar_hash_index
+from fetch_engine import detect_platform, print_lock, run_concurrent
+from run_manifest import DOWNLOADED, FAILED, RESOLVED, RunManifest
+import platforms
+from platforms import (
+    extract_instagram_username, get_instaloader, fetch_instagram_avatar,
+    extract_facebook_id, fetch_facebook_graph_picture, fetch_facebook_og_image, fetch_facebook_avatar,
+    extract_youtube_channel, fetch_youtube_avatar,
+)
+
 # --- 設定區 ---
 DOWNLOAD_DIR = "kol_avatars"
 HTML_FILENAME = "index.html"
 KOL_DATA_FILE = r'd:\google antigravity\kolphoto\kol_list_cleaned.json'
 
+# 平台解析器註冊表（Instagram / Facebook / YouTube 的抓取方法）
+REGISTRY = platforms.get_registry()
+
 # 確保資料夾存在
 if not os.path.exists(DOWNLOAD_DIR):
     os.makedirs(DOWNLOAD_DIR)
 
-# 請求 headers（模擬瀏覽器）
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-}
-
 def safe_filename(name):
     """產生安全的檔案名稱"""
     return re.sub(r'[<>:"/\\|?*]', '_', name)
 
-def download_image(name, url):
-    """下載圖片並儲存到本地"""
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        if response.status_code == 200:
-            # 判斷副檔名
-            content_type = response.headers.get('content-type', '')
-            if 'png' in content_type:
-                ext = '.png'
-            elif 'gif' in content_type:
-                ext = '.gif'
-            elif 'webp' in content_type:
-                ext = '.webp'
-            else:
-                ext = '.jpg'
-            
-            filename = f"{safe_filename(name)}{ext}"
-            filepath = os.path.join(DOWNLOAD_DIR, filename)
-            
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            return filepath
-    except Exception as e:
-        print(f"    下載失敗: {e}")
-    return None
-
-def extract_instagram_username(url):
-    """從 Instagram URL 提取用戶名"""
-    patterns = [
-        r'instagram\.com/([^/?]+)',
-        r'instagram\.com/p/[^/]+.*?by=([^&]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            username = match.group(1).strip()
-            if username not in ['p', 'reel', 'stories', 'explore', 'accounts']:
-                return username
-    return None
-
-# Instagram loader 全域變數
-_insta_loader = None
-
-def get_instaloader():
-    """取得或建立 instaloader 實例（帶登入）"""
-    global _insta_loader
-    if _insta_loader is None:
-        try:
-            import instaloader
-            _insta_loader = instaloader.Instaloader()
-            # 嘗試登入
-            try:
-                _insta_loader.login('kingway_publishing', 'Cmoney1234')
-                print("    [IG] 登入成功")
-            except Exception as e:
-                print(f"    [IG] 登入失敗，使用匿名模式: {e}")
-        except ImportError:
-            print("    [IG] instaloader 未安裝")
-            return None
-    return _insta_loader
-
-def fetch_instagram_avatar(url):
-    """從 Instagram 抓取頭像"""
-    username = extract_instagram_username(url)
-    if not username:
-        return None
-    
-    # 方法1: 使用 instaloader（更穩定）
-    try:
-        loader = get_instaloader()
-        if loader:
-            import instaloader
-            profile = instaloader.Profile.from_username(loader.context, username)
-            return profile.profile_pic_url
-    except Exception as e:
-        pass
-    
-    # 方法2: 從頁面 HTML 解析 og:image (fallback)
-    try:
-        profile_url = f"https://www.instagram.com/{username}/"
-        response = requests.get(profile_url, headers=HEADERS, timeout=10)
-        if response.status_code == 200:
-            match = re.search(r'<meta property="og:image" content="([^"]+)"', response.text)
-            if match:
-                return match.group(1)
-    except:
-        pass
-    
-    return None
-
-def extract_facebook_id(url):
-    """從 Facebook URL 提取用戶 ID 或用戶名"""
-    patterns = [
-        r'facebook\.com/profile\.php\?id=(\d+)',
-        r'facebook\.com/people/[^/]+/(\d+)',
-        r'facebook\.com/([^/?]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            result = match.group(1).strip()
-            if result not in ['p', 'share', 'sharer', 'dialog', 'watch', 'groups', 'events']:
-                return result
-    return None
+def fetch_avatar_by_platform(social_link, exclude=()):
+    """根據平台類型選擇對應的抓取方法（透過共用的平台註冊表）"""
+    return platforms.fetch_avatar_by_platform(social_link, REGISTRY, exclude)
 
-def fetch_facebook_avatar(url):
-    """從 Facebook 抓取頭像"""
-    fb_id = extract_facebook_id(url)
-    if not fb_id:
-        return None
-    
-    try:
-        # 使用 Graph API 風格 URL（適用數字 ID）
-        if fb_id.isdigit():
-            avatar_url = f"https://graph.facebook.com/{fb_id}/picture?type=large"
-            response = requests.get(avatar_url, headers=HEADERS, timeout=10, allow_redirects=True)
-            if response.status_code == 200 and len(response.content) > 1000:
-                return response.url
-    except:
-        pass
-    
-    try:
-        # 從頁面 HTML 解析 og:image
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        if response.status_code == 200:
-            match = re.search(r'<meta property="og:image" content="([^"]+)"', response.text)
-            if match:
-                return match.group(1)
-    except:
-        pass
-    
-    return None
-
-def extract_youtube_channel(url):
-    """從 YouTube URL 提取頻道資訊"""
-    patterns = [
-        r'youtube\.com/@([^/?]+)',
-        r'youtube\.com/channel/([^/?]+)',
-        r'youtube\.com/c/([^/?]+)',
-        r'youtube\.com/user/([^/?]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1).strip()
-    return None
-
-def fetch_youtube_avatar(url):
-    """從 YouTube 抓取頭像"""
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        if response.status_code == 200:
-            # 抓取頻道頭像 URL
-            match = re.search(r'"avatar":\{"thumbnails":\[\{"url":"([^"]+)"', response.text)
-            if match:
-                return match.group(1).replace('\\u0026', '&')
-            # 備用方法
-            match = re.search(r'<link rel="image_src" href="([^"]+)"', response.text)
-            if match:
-                return match.group(1)
-    except:
-        pass
-    return None
-
-def fetch_avatar_by_platform(social_link):
-    """根據平台類型選擇對應的抓取方法"""
-    if not social_link or not social_link.startswith('http'):
-        return None, None
-    
-    url_lower = social_link.lower()
-    
-    if 'instagram.com' in url_lower:
-        return fetch_instagram_avatar(social_link), 'Instagram'
-    elif 'facebook.com' in url_lower:
-        return fetch_facebook_avatar(social_link), 'Facebook'
-    elif 'youtube.com' in url_lower:
-        return fetch_youtube_avatar(social_link), 'YouTube'
-    elif 'x.com' in url_lower or 'twitter.com' in url_lower:
-        # Twitter/X 需要登入，暫不支援
-        return None, 'X/Twitter'
-    
-    return None, None
-
-def search_fallback(name):
-    """使用 DuckDuckGo 搜尋作為 fallback"""
+def search_fallback(name, clean_name=None):
+    """
+    使用 DuckDuckGo 搜尋作為 fallback（共用的 ImageSearch 與查詢快取）
+    依尺寸與來源網域排序後依序嘗試多個候選圖片，回傳 (本地路徑, 圖片 URL)
+    """
+    search_query = f"{name} 台灣 KOL 頭像"
     try:
-        from duckduckgo_search import DDGS
-        with DDGS() as ddgs:
-            search_query = f"{name} 台灣 KOL 頭像"
-            results = ddgs.images(search_query, max_results=1)
-            if results:
-                return results[0]['image']
+        results = get_image_search().search(search_query)
     except Exception as e:
         print(f"    搜尋 fallback 失敗: {e}")
-    return None
+        return None, None
+    return get_image_search().download_best(
+        results, lambda url: download_image(clean_name or name, url)
+    )
 
-def main():
-    # 讀取 KOL 資料
-    with open(KOL_DATA_FILE, 'r', encoding='utf-8') as f:
-        kol_list = json.load(f)
-    
-    print(f"載入 {len(kol_list)} 位 KOL 資料")
-    print("="*60)
-    
-    results = []
-    stats = {'instagram': 0, 'facebook': 0, 'youtube': 0, 'fallback': 0, 'failed': 0}
+def process_kol(idx, total, kol, manifest, retry_failed=False):
+    """處理單一 KOL：抓取頭像 URL 並下載，各階段寫入 run manifest，回傳結果供 main 彙整統計"""
+    name = kol['display_name']
+    clean_name = kol['name']
+    social_link = kol.get('social_link', '')
     
-    for idx, kol in enumerate(kol_list, 1):
-        name = kol['display_name']
-        clean_name = kol['name']
-        social_link = kol.get('social_link', '')
+    # 整位 KOL 記為 kol 階段，底下的 parse / resolve / download / write 各自再記一段
+    with metrics.span('kol', kol=clean_name) as kol_span:
+        with metrics.span('parse') as parse_span:
+            kol_span['platform'] = parse_span['platform'] = detect_platform(social_link)
         
-        print(f"[{idx}/{len(kol_list)}] {name}")
+        lines = [f"[{idx}/{total}] {name}"]
+        
+        # 上次執行已下載且檔案仍在：不必重新解析與下載
+        existing_path = manifest.downloaded_path(clean_name)
+        if existing_path:
+            record = manifest.get(clean_name)
+            with print_lock:
+                print(f"{lines[0]} - 已存在，跳過")
+            return {
+                'name': name,
+                'avatar_url': record.get('avatar_url'),
+                'platform': record.get('platform') or kol_span['platform'],
+                'path': existing_path,
+            }
         
         avatar_url = None
         platform = None
+        local_path = None
+        
+        has_link = social_link and social_link.startswith('http')
+        
+        # 先前已重試多次仍失敗的連結直接略過
+        if has_link and not retry_failed and manifest.is_permanent_failure(clean_name):
+            lines.append(f"    - 已知無法取得（{manifest.get(clean_name).get('error')}），跳過")
+            with print_lock:
+                print("\n".join(lines))
+            return {
+                'name': name,
+                'avatar_url': None,
+                'platform': kol_span['platform'],
+                'path': None,
+            }
         
         # 嘗試從社群連結抓取
-        if social_link and social_link.startswith('http'):
+        if has_link:
+            manifest.start(clean_name)
             avatar_url, platform = fetch_avatar_by_platform(social_link)
             if avatar_url:
-                print(f"    ✓ 從 {platform} 取得頭像")
+                lines.append(f"    ✓ 從 {platform} 取得頭像")
+                manifest.mark(clean_name, RESOLVED, platform=platform, avatar_url=avatar_url)
+            else:
+                manifest.mark(clean_name, FAILED, platform=platform, error='no_avatar')
         
         # 無社群連結的 KOL 暫時跳過（避免 DDG rate limit）
         if not avatar_url:
             if social_link and social_link.startswith('http'):
-                print(f"    ✗ 無法從社群取得頭像")
+                lines.append(f"    ✗ 無法從社群取得頭像")
             else:
-                print(f"    - 無社群連結，跳過")
+                lines.append(f"    - 無社群連結，跳過")
         
-        # 下載圖片
+        # 下載圖片（並檢查是否為預設 / 重複頭像）
         if avatar_url:
-            local_path = download_image(clean_name, avatar_url)
+            local_path, avatar_url, platform, verdict = download_screened(
+                clean_name, avatar_url, platform, social_link, lines, manifest
+            )
             if local_path:
-                results.append({
-                    'name': name,
-                    'path': local_path,
-                    'platform': platform
-                })
-                if platform == 'Instagram':
-                    stats['instagram'] += 1
-                elif platform == 'Facebook':
-                    stats['facebook'] += 1
-                elif platform == 'YouTube':
-                    stats['youtube'] += 1
-                else:
-                    stats['fallback'] += 1
+                manifest.mark(clean_name, DOWNLOADED, path=local_path, avatar_url=avatar_url, flag=verdict)
+            elif verdict == PLACEHOLDER:
+                manifest.mark(clean_name, FAILED, error='placeholder')
+                lines.append(f"    ✗ 只取得預設頭像")
             else:
-                stats['failed'] += 1
-                print(f"    ✗ 下載失敗")
+                manifest.mark(clean_name, FAILED, error='download_failed')
+                lines.append(f"    ✗ 下載失敗")
         else:
-            stats['failed'] += 1
-            print(f"    ✗ 無法取得頭像")
+            lines.append(f"    ✗ 無法取得頭像")
+        
+        with print_lock:
+            print("\n".join(lines))
         
-        # 每 10 個休息一下
-        if idx % 10 == 0:
-            time.sleep(2)
+        return {
+            'name': name,
+            'avatar_url': avatar_url,
+            'platform': platform,
+            'path': local_path,
+        }
+
+def main(concurrent=False, retry_failed=False, prometheus=False):
+    # 讀取 KOL 資料
+    with open(KOL_DATA_FILE, 'r', encoding='utf-8') as f:
+        kol_list = json.load(f)
+    
+    print(f"載入 {len(kol_list)} 位 KOL 資料")
+    print("="*60)
+    
+    total = len(kol_list)
+    manifest = RunManifest()
+    recorder = metrics.start_metrics()
+    if concurrent:
+        # 並行模式：各平台依 PLATFORM_LIMITS 同時處理，結果仍按原順序彙整
+        indexed = list(enumerate(kol_list, 1))
+        outcomes = run_concurrent(
+            indexed,
+            lambda item: process_kol(item[0], total, item[1], manifest, retry_failed),
+            lambda item: detect_platform(item[1].get('social_link', '')),
+        )
+    else:
+        # 節流交給 rate_limiter 依平台 / 主機控制
+        outcomes = [process_kol(idx, total, kol, manifest, retry_failed) for idx, kol in enumerate(kol_list, 1)]
+    
+    # 整理執行紀錄
+    manifest.compact()
+    manifest.close()
+    
+    # 關閉共用連線池，保存各解析方法的命中率
+    http_client.close()
+    close_image_search()
+    REGISTRY.save_stats()
+    get_avatar_hash_index().save()
+    get_avatar_store().compact()
+    recorder.close()
+    
+    results = []
+    stats = {'instagram': 0, 'facebook': 0, 'youtube': 0, 'fallback': 0, 'failed': 0}
+    
+    for outcome in outcomes:
+        platform = outcome['platform']
+        if outcome['path']:
+            results.append({
+                'name': outcome['name'],
+                'path': outcome['path'],
+                'platform': platform
+            })
+            if platform == 'Instagram':
+                stats['instagram'] += 1
+            elif platform == 'Facebook':
+                stats['facebook'] += 1
+            elif platform == 'YouTube':
+                stats['youtube'] += 1
+            else:
+                stats['fallback'] += 1
+        else:
+            stats['failed'] += 1
     
     print("\n" + "="*60)
     print("抓取完成統計:")
@@ -297,6 +211,11 @@ def main():
     print(f"  搜尋補充:  {stats['fallback']}")
     print(f"  失敗:      {stats['failed']}")
     print(f"  總成功:    {len(results)}/{len(kol_list)}")
+    recorder.print_summary()
+    print(f"各階段紀錄已儲存至: {metrics.METRICS_FILE}")
+    if prometheus:
+        recorder.write_prometheus()
+        print(f"Prometheus 指標已儲存至: {metrics.PROMETHEUS_FILE}")
     
     return results
 
@@ -406,7 +325,14 @@ def generate_html(kol_data):
     print(f"\nHTML 已生成：{HTML_FILENAME}")
 
 if __name__ == "__main__":
-    data = main()
+    # 加上 --concurrent 參數以並行模式執行
+    # 加上 --retry-failed 參數重試先前已確定失敗的連結
+    # 加上 --prometheus 參數另外輸出 Prometheus 文字格式的指標
+    data = main(
+        concurrent='--concurrent' in sys.argv,
+        retry_failed='--retry-failed' in sys.argv,
+        prometheus='--prometheus' in sys.argv,
+    )
     if data:
         generate_html(data)
     else:
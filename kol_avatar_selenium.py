@@ -5,183 +5,180 @@ KOL 社群頭像抓取工具 v2
 
 import os
 import re
+import sys
 import json
 import time
-import requests
+import threading
 from urllib.parse import urlparse, unquote
 from datetime import datetime
 
+import http_client
+import metrics
+from rate_limiter import get_rate_limiter
+from avatar_store import get_avatar_store
+from avatar_download import download_screened
+from avatar_hash import PLACEHOLDER, get_avatar_hash_index
+from selenium_pool import POOL_SIZE, DriverPool
+from fetch_engine import PLATFORM_LIMITS, detect_platform, print_lock, run_concurrent
+from tiered_resolver import Strategy
+from run_manifest import DOWNLOADED, FAILED, RESOLVED, RunManifest
+import platforms
+from platforms import (
+    extract_instagram_username, get_instaloader, fetch_instagram_avatar,
+    extract_facebook_id, fetch_youtube_avatar,
+)
+
 # --- 設定區 ---
 DOWNLOAD_DIR = "kol_avatars"
 HTML_FILENAME = "index.html"
 KOL_DATA_FILE = r'd:\google antigravity\kolphoto\kol_list_cleaned.json'
+FB_PAGE_DEADLINE = 10   # 等待 Facebook 頁面出現頭像的秒數上限
+FB_POLL_INTERVAL = 0.25
+BLOCK_HEAVY_RESOURCES = True    # headless 瀏覽器不載入圖片、字型與影音
+
+# Facebook 頁面中可能是頭像的元素
+FB_AVATAR_SELECTORS = [
+    'img[data-imgperflogname="profileCoverPhoto"]',
+    'image[preserveAspectRatio="xMidYMid slice"]',
+    'svg[aria-label] image',
+    'img.x1lq5wgf',  # 常見的 FB 頭像 class
+]
+
+# BLOCK_HEAVY_RESOURCES 開啟時以 CDP 擋下的網址樣式
+BLOCKED_URL_PATTERNS = [
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.webm', '*.m4a', '*.mp3',
+]
 
 # 確保資料夾存在
 if not os.path.exists(DOWNLOAD_DIR):
     os.makedirs(DOWNLOAD_DIR)
 
-# 請求 headers（模擬瀏覽器）
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-}
+# Selenium driver 池全域變數
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+_chromedriver_path = None
 
-# Selenium driver 全域變數
-_selenium_driver = None
+def create_selenium_driver():
+    """建立一個 Selenium driver（Chrome headless），失敗時回傳 None"""
+    global _chromedriver_path
+    try:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+        
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        chrome_options.add_argument("--lang=zh-TW")
+        # DOM 就緒即返回，不等待所有子資源
+        chrome_options.page_load_strategy = 'eager'
+        if BLOCK_HEAVY_RESOURCES:
+            # 只讀取 <img> 的 src，不需要真的下載圖片
+            chrome_options.add_experimental_option(
+                "prefs", {"profile.managed_default_content_settings.images": 2}
+            )
+        
+        # chromedriver 只需下載 / 定位一次，池中每個 driver 共用
+        with _driver_pool_lock:
+            if _chromedriver_path is None:
+                _chromedriver_path = ChromeDriverManager().install()
+        service = Service(_chromedriver_path)
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        if BLOCK_HEAVY_RESOURCES:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        print("    [Selenium] Chrome driver 初始化成功")
+        return driver
+    except Exception as e:
+        print(f"    [Selenium] 初始化失敗: {e}")
+        return None
 
-def get_selenium_driver():
-    """取得 Selenium driver（Chrome headless）"""
-    global _selenium_driver
-    if _selenium_driver is None:
-        try:
-            from selenium import webdriver
-            from selenium.webdriver.chrome.service import Service
-            from selenium.webdriver.chrome.options import Options
-            from webdriver_manager.chrome import ChromeDriverManager
-            
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--window-size=1920,1080")
-            chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-            chrome_options.add_argument("--lang=zh-TW")
-            
-            service = Service(ChromeDriverManager().install())
-            _selenium_driver = webdriver.Chrome(service=service, options=chrome_options)
-            print("    [Selenium] Chrome driver 初始化成功")
-        except Exception as e:
-            print(f"    [Selenium] 初始化失敗: {e}")
-            return None
-    return _selenium_driver
+def get_driver_pool():
+    """取得 Selenium driver 池（driver 在第一次借用時才啟動）"""
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            _driver_pool = DriverPool(create_selenium_driver)
+    return _driver_pool
 
 def close_selenium_driver():
-    """關閉 Selenium driver"""
-    global _selenium_driver
-    if _selenium_driver:
-        _selenium_driver.quit()
-        _selenium_driver = None
+    """關閉 Selenium driver 池"""
+    global _driver_pool
+    with _driver_pool_lock:
+        pool, _driver_pool = _driver_pool, None
+    if pool:
+        pool.shutdown()
 
 def safe_filename(name):
     """產生安全的檔案名稱"""
     return re.sub(r'[<>:"/\\|?*]', '_', name)
 
-def download_image(name, url):
-    """下載圖片並儲存到本地"""
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        if response.status_code == 200:
-            content_type = response.headers.get('content-type', '')
-            if 'png' in content_type:
-                ext = '.png'
-            elif 'gif' in content_type:
-                ext = '.gif'
-            elif 'webp' in content_type:
-                ext = '.webp'
-            else:
-                ext = '.jpg'
-            
-            filename = f"{safe_filename(name)}{ext}"
-            filepath = os.path.join(DOWNLOAD_DIR, filename)
-            
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            return filepath
-    except Exception as e:
-        print(f"    下載失敗: {e}")
-    return None
-
-# ==================== Instagram ====================
-
-def extract_instagram_username(url):
-    """從 Instagram URL 提取用戶名"""
-    patterns = [
-        r'instagram\.com/([^/?]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            username = match.group(1).strip()
-            if username not in ['p', 'reel', 'stories', 'explore', 'accounts', 'about']:
-                return username
-    return None
-
-_insta_loader = None
+# ==================== Facebook (Selenium) ====================
 
-def get_instaloader():
-    """取得 instaloader 實例"""
-    global _insta_loader
-    if _insta_loader is None:
-        try:
-            import instaloader
-            _insta_loader = instaloader.Instaloader()
-            try:
-                _insta_loader.login('kingway_publishing', 'Cmoney1234')
-                print("    [IG] 登入成功")
-            except Exception as e:
-                print(f"    [IG] 登入失敗: {e}")
-        except ImportError:
+def fetch_facebook_avatar_selenium(url):
+    """使用 Selenium 從 Facebook 抓取頭像（從 driver 池借用瀏覽器）"""
+    with get_driver_pool().driver() as driver:
+        if not driver:
             return None
-    return _insta_loader
+        return scan_facebook_page(driver, url)
 
-def fetch_instagram_avatar(url):
-    """從 Instagram 抓取頭像"""
-    username = extract_instagram_username(url)
-    if not username:
-        return None
+def find_facebook_avatar(driver):
+    """
+    在目前頁面中找頭像 URL，找不到回傳 False
+    作為 WebDriverWait 的等待條件，頁面就緒的當下即可返回
+    """
+    from selenium.webdriver.common.by import By
     
-    try:
-        loader = get_instaloader()
-        if loader:
-            import instaloader
-            profile = instaloader.Profile.from_username(loader.context, username)
-            return profile.profile_pic_url
-    except:
-        pass
-    return None
-
-# ==================== Facebook (Selenium) ====================
-
-def fetch_facebook_avatar_selenium(url):
-    """使用 Selenium 從 Facebook 抓取頭像"""
-    driver = get_selenium_driver()
-    if not driver:
-        return None
+    # 方法1: 找 profile picture image
+    for selector in FB_AVATAR_SELECTORS:
+        try:
+            elements = driver.find_elements(By.CSS_SELECTOR, selector)
+            for elem in elements:
+                src = elem.get_attribute('xlink:href') or elem.get_attribute('src')
+                if src and ('fbcdn' in src or 'facebook' in src):
+                    return src
+        except:
+            continue
     
+    # 方法2: 從頁面源碼找 profilePicLarge
+    match = re.search(r'"profilePicLarge":\{"uri":"([^"]+)"', driver.page_source)
+    if match:
+        return match.group(1).replace('\\/', '/')
+    return False
+
+def scan_facebook_page(driver, url):
+    """以指定的 driver 載入 Facebook 頁面並找出頭像 URL"""
     try:
-        driver.get(url)
-        time.sleep(3)  # 等待頁面載入
-        
-        # 方法1: 找 profile picture image
-        from selenium.webdriver.common.by import By
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
         
-        # 嘗試多種選擇器
-        selectors = [
-            'img[data-imgperflogname="profileCoverPhoto"]',
-            'image[preserveAspectRatio="xMidYMid slice"]',
-            'svg[aria-label] image',
-            'img.x1lq5wgf',  # 常見的 FB 頭像 class
-        ]
-        
-        for selector in selectors:
-            try:
-                elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                for elem in elements:
-                    src = elem.get_attribute('xlink:href') or elem.get_attribute('src')
-                    if src and ('fbcdn' in src or 'facebook' in src):
-                        return src
-            except:
-                continue
+        get_rate_limiter().acquire(platform='Facebook', url=url)
+        # 載入頁面與等待頭像共用同一個期限，整體最多 FB_PAGE_DEADLINE 秒
+        deadline = time.monotonic() + FB_PAGE_DEADLINE
+        driver.set_page_load_timeout(FB_PAGE_DEADLINE)
+        try:
+            driver.get(url)
+        except TimeoutException:
+            # 逾時仍可能已載入足夠的 DOM，繼續嘗試
+            pass
         
-        # 方法2: 從頁面源碼找 og:image
-        page_source = driver.page_source
-        match = re.search(r'"profilePicLarge":\{"uri":"([^"]+)"', page_source)
-        if match:
-            return match.group(1).replace('\\/', '/')
+        # 在剩餘時間內等到任一選擇器或 profilePicLarge 出現（時間用完時只檢查一次）
+        remaining = max(0.0, deadline - time.monotonic())
+        try:
+            return WebDriverWait(driver, remaining, poll_frequency=FB_POLL_INTERVAL).until(
+                find_facebook_avatar
+            )
+        except TimeoutException:
+            pass
         
-        match = re.search(r'<meta property="og:image" content="([^"]+)"', page_source)
+        # 方法3: 從頁面源碼找 og:image
+        match = re.search(r'<meta property="og:image" content="([^"]+)"', driver.page_source)
         if match:
             return match.group(1)
             
@@ -190,123 +187,159 @@ def fetch_facebook_avatar_selenium(url):
     
     return None
 
-# ==================== YouTube ====================
+# ==================== 平台註冊表 ====================
 
-def fetch_youtube_avatar(url):
-    """從 YouTube 抓取頭像"""
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        if response.status_code == 200:
-            match = re.search(r'"avatar":\{"thumbnails":\[\{"url":"([^"]+)"', response.text)
-            if match:
-                return match.group(1).replace('\\u0026', '&')
-            match = re.search(r'<link rel="image_src" href="([^"]+)"', response.text)
-            if match:
-                return match.group(1)
-    except:
-        pass
-    return None
+# 共用的平台註冊表，Facebook 另外加上成本最高的瀏覽器方法（便宜的 HTTP 方法都失敗才會用到）
+REGISTRY = platforms.get_registry()
+REGISTRY.add_strategy('Facebook', Strategy('selenium', fetch_facebook_avatar_selenium, cost=10))
+
+def fetch_facebook_avatar(url):
+    """從 Facebook 抓取頭像（分層解析）"""
+    avatar_url, _ = REGISTRY.get('Facebook').tiers.resolve(url)
+    return avatar_url
 
 # ==================== 主程序 ====================
 
-def fetch_avatar_by_platform(social_link):
-    """根據平台類型選擇對應的抓取方法"""
-    if not social_link or not social_link.startswith('http'):
-        return None, None
-    
-    url_lower = social_link.lower()
-    
-    if 'instagram.com' in url_lower:
-        return fetch_instagram_avatar(social_link), 'Instagram'
-    elif 'facebook.com' in url_lower:
-        return fetch_facebook_avatar_selenium(social_link), 'Facebook'
-    elif 'youtube.com' in url_lower:
-        return fetch_youtube_avatar(social_link), 'YouTube'
+def fetch_avatar_by_platform(social_link, exclude=()):
+    """根據平台類型選擇對應的抓取方法（透過共用的平台註冊表）"""
+    return platforms.fetch_avatar_by_platform(social_link, REGISTRY, exclude)
+
+def process_kol(idx, total, kol, manifest):
+    """抓取並下載單一 KOL 的頭像，每個階段都寫入 run manifest，回傳 (結果紀錄或 None, 平台)"""
+    name = kol['display_name']
+    clean_name = kol['name']
+    social_link = kol.get('social_link', '')
     
-    return None, None
+    # 整位 KOL 記為 kol 階段，底下的 parse / resolve / download / write 各自再記一段
+    with metrics.span('kol', kol=clean_name) as kol_span:
+        with metrics.span('parse') as parse_span:
+            kol_span['platform'] = parse_span['platform'] = detect_platform(social_link)
+        
+        lines = [f"[{idx}/{total}] {name}"]
+        record = None
+        manifest.start(clean_name)
+        
+        avatar_url, platform = fetch_avatar_by_platform(social_link)
+        
+        if avatar_url:
+            lines.append(f"    ✓ 從 {platform} 取得頭像 URL")
+            manifest.mark(clean_name, RESOLVED, platform=platform, avatar_url=avatar_url)
+            local_path, avatar_url, platform, verdict = download_screened(
+                clean_name, avatar_url, platform, social_link, lines, manifest
+            )
+            if local_path:
+                record = {
+                    'display_name': name,
+                    'clean_name': clean_name,
+                    'path': local_path,
+                    'platform': platform
+                }
+                manifest.mark(clean_name, DOWNLOADED, path=local_path, avatar_url=avatar_url, flag=verdict)
+                lines.append(f"    ✓ 下載成功")
+            elif verdict == PLACEHOLDER:
+                manifest.mark(clean_name, FAILED, error='placeholder')
+                lines.append(f"    ✗ 只取得預設頭像")
+            else:
+                manifest.mark(clean_name, FAILED, error='download_failed')
+                lines.append(f"    ✗ 下載失敗")
+        else:
+            manifest.mark(clean_name, FAILED, platform=platform, error='no_avatar')
+            lines.append(f"    ✗ 無法取得頭像")
+        
+        with print_lock:
+            print("\n".join(lines))
+        return record, platform
 
-def main():
+def main(retry_failed=False, prometheus=False):
     # 讀取 KOL 資料
     with open(KOL_DATA_FILE, 'r', encoding='utf-8') as f:
         kol_list = json.load(f)
     
     # 篩選有社群連結的 KOL
     kol_with_links = [k for k in kol_list if k.get('social_link', '').startswith('http')]
+    total = len(kol_with_links)
     
-    print(f"載入 {len(kol_list)} 位 KOL，其中 {len(kol_with_links)} 位有社群連結")
+    print(f"載入 {len(kol_list)} 位 KOL，其中 {total} 位有社群連結")
     print("="*60)
     
-    results = []
     stats = {'instagram': 0, 'facebook': 0, 'youtube': 0, 'failed': 0}
     
-    # 先載入已經成功的結果
-    existing_files = set()
+    # 先載入已經成功的結果（檔名主體 → 檔名，只掃描一次資料夾）
+    existing_files = {}
     if os.path.exists(DOWNLOAD_DIR):
         for f in os.listdir(DOWNLOAD_DIR):
-            name = os.path.splitext(f)[0]
-            existing_files.add(name)
+            existing_files.setdefault(os.path.splitext(f)[0], f)
     
+    # 上次執行的進度；retry_failed 時連已確定失敗的連結也重試
+    manifest = RunManifest()
+    recorder = metrics.start_metrics()
+    
+    # 每位 KOL 的結果依原順序放在 slots；需要抓取的先記下，之後並行處理
+    slots = []
+    pending = []
     for idx, kol in enumerate(kol_with_links, 1):
         name = kol['display_name']
         clean_name = kol['name']
         social_link = kol.get('social_link', '')
         
         # 檢查是否已經下載過
-        if safe_filename(clean_name) in existing_files:
-            print(f"[{idx}/{len(kol_with_links)}] {name} - 已存在，跳過")
-            # 找到現有檔案
-            for f in os.listdir(DOWNLOAD_DIR):
-                if f.startswith(safe_filename(clean_name)):
-                    platform = 'Existing'
-                    if 'instagram' in social_link.lower():
-                        platform = 'Instagram'
-                    elif 'facebook' in social_link.lower():
-                        platform = 'Facebook'
-                    elif 'youtube' in social_link.lower():
-                        platform = 'YouTube'
-                    results.append({
-                        'display_name': name,
-                        'clean_name': clean_name,
-                        'path': os.path.join(DOWNLOAD_DIR, f),
-                        'platform': platform
-                    })
-                    break
+        existing = existing_files.get(safe_filename(clean_name))
+        existing_path = os.path.join(DOWNLOAD_DIR, existing) if existing else manifest.downloaded_path(clean_name)
+        if existing_path:
+            print(f"[{idx}/{total}] {name} - 已存在，跳過")
+            platform = detect_platform(social_link) or 'Existing'
+            slots.append({
+                'display_name': name,
+                'clean_name': clean_name,
+                'path': existing_path,
+                'platform': platform
+            })
             continue
         
-        print(f"[{idx}/{len(kol_with_links)}] {name}")
-        
-        avatar_url, platform = fetch_avatar_by_platform(social_link)
+        # 先前已重試多次仍失敗的連結
+        if not retry_failed and manifest.is_permanent_failure(clean_name):
+            error = manifest.get(clean_name).get('error')
+            print(f"[{idx}/{total}] {name} - 已知無法取得（{error}），跳過")
+            slots.append(None)
+            continue
         
-        if avatar_url:
-            print(f"    ✓ 從 {platform} 取得頭像 URL")
-            local_path = download_image(clean_name, avatar_url)
-            if local_path:
-                results.append({
-                    'display_name': name,
-                    'clean_name': clean_name,
-                    'path': local_path,
-                    'platform': platform
-                })
-                if platform == 'Instagram':
-                    stats['instagram'] += 1
-                elif platform == 'Facebook':
-                    stats['facebook'] += 1
-                elif platform == 'YouTube':
-                    stats['youtube'] += 1
-                print(f"    ✓ 下載成功")
-            else:
-                stats['failed'] += 1
-                print(f"    ✗ 下載失敗")
+        slots.append(None)
+        pending.append((len(slots) - 1, idx, kol))
+    
+    # Facebook 的並行數等於 driver 池大小，其餘平台沿用 fetch_engine 的上限
+    limits = {**PLATFORM_LIMITS, 'Facebook': POOL_SIZE}
+    outcomes = run_concurrent(
+        pending,
+        lambda item: process_kol(item[1], total, item[2], manifest),
+        lambda item: detect_platform(item[2].get('social_link', '')),
+        limits=limits,
+    )
+    
+    for (slot_index, _, _), (record, platform) in zip(pending, outcomes):
+        slots[slot_index] = record
+        if record:
+            if platform == 'Instagram':
+                stats['instagram'] += 1
+            elif platform == 'Facebook':
+                stats['facebook'] += 1
+            elif platform == 'YouTube':
+                stats['youtube'] += 1
         else:
             stats['failed'] += 1
-            print(f"    ✗ 無法取得頭像")
-        
-        # 每 5 個休息一下
-        if idx % 5 == 0:
-            time.sleep(1)
     
-    # 關閉 Selenium
+    results = [record for record in slots if record]
+    
+    # 整理執行紀錄
+    manifest.compact()
+    manifest.close()
+    
+    # 關閉 Selenium 與共用連線池，保存各解析方法的命中率
     close_selenium_driver()
+    http_client.close()
+    REGISTRY.save_stats()
+    get_avatar_hash_index().save()
+    get_avatar_store().compact()
+    recorder.close()
     
     print("\n" + "="*60)
     print("本次抓取統計:")
@@ -314,7 +347,16 @@ def main():
     print(f"  Facebook:  {stats['facebook']}")
     print(f"  YouTube:   {stats['youtube']}")
     print(f"  失敗:      {stats['failed']}")
-    print(f"  總成功:    {len(results)}/{len(kol_with_links)} (有連結者)")
+    print(f"  總成功:    {len(results)}/{total} (有連結者)")
+    print("解析方法命中率:")
+    for platform_name, strategies in REGISTRY.summary().items():
+        for strategy_name, hits, attempts in strategies:
+            print(f"  {platform_name:<10} {strategy_name:<14} {hits}/{attempts}")
+    recorder.print_summary()
+    print(f"各階段紀錄已儲存至: {metrics.METRICS_FILE}")
+    if prometheus:
+        recorder.write_prometheus()
+        print(f"Prometheus 指標已儲存至: {metrics.PROMETHEUS_FILE}")
     
     return results
 
@@ -440,7 +482,9 @@ def generate_html(kol_data):
 
 if __name__ == "__main__":
     try:
-        data = main()
+        # 加上 --retry-failed 參數重試先前已確定失敗的連結
+        # 加上 --prometheus 參數另外輸出 Prometheus 文字格式的指標
+        data = main(retry_failed='--retry-failed' in sys.argv, prometheus='--prometheus' in sys.argv)
         if data:
             generate_html(data)
         else:
@@ -0,0 +1,107 @@
+"""
+KOL 紀錄的模糊去重索引
+每筆紀錄依「正規化名稱」與「社群帳號」（IG 帳號、FB ID、YT 頻道）分到多個 block，
+只在同一個 block 內做有上限的編輯距離比對，整體接近線性時間，不需要兩兩比較
+"""
+
+from kol_matcher import fold
+from social_links import link_identity
+
+# --- 設定區 ---
+FUZZY_MIN_LEN = 6       # 名稱至少這麼長才允許有一個字不同（短的中文名差一字通常是不同人）
+MAX_EDIT_DISTANCE = 1
+ID_EDIT_DISTANCE = 2    # 同一個社群帳號下，名稱差距在此以內或互相包含即視為同一人
+MAX_BLOCK_SIZE = 200    # 過大的前綴 / 後綴 block 不做模糊比對
+SUMMARY_FIELDS = ('name', 'display_name')   # 索引只保留這些欄位，重複時回傳給呼叫端顯示
+
+def bounded_edit_distance(a, b, limit):
+    """Levenshtein 距離；確定超過 limit 時提早結束並回傳 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        # 每一列的最小值只會增加，已超過 limit 就不可能再回到範圍內
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+class DedupIndex:
+    """
+    逐筆加入 KOL 紀錄（name / display_name / social_link），找出與既有紀錄重複者
+    每筆只保留比對用的正規化名稱、社群帳號與 SUMMARY_FIELDS，不保留整筆紀錄，串流清洗時記憶體不隨欄位數增加
+    """
+
+    def __init__(self):
+        self.records = []
+        self.blocks = {}
+
+    def _keys(self, kol):
+        keys = {fold(kol.get(field) or '') for field in ('name', 'display_name')}
+        return {key for key in keys if key}
+
+    def _identity(self, kol):
+        link = (kol.get('social_link') or '').strip()
+        identity = link_identity(link)
+        return (identity[0], identity[1].lower()) if identity else None
+
+    def _block_keys(self, keys, identity):
+        blocks = {('key', key) for key in keys}
+        for key in keys:
+            if len(key) >= FUZZY_MIN_LEN:
+                blocks.add(('prefix', key[:2]))
+                blocks.add(('suffix', key[-2:]))
+        if identity:
+            blocks.add(('id',) + identity)
+        return blocks
+
+    def _same(self, keys, identity, other_keys, other_identity):
+        if keys & other_keys:
+            return True
+        if identity and identity == other_identity:
+            return any(
+                a in b or b in a or bounded_edit_distance(a, b, ID_EDIT_DISTANCE) <= ID_EDIT_DISTANCE
+                for a in keys for b in other_keys
+            )
+        return any(
+            min(len(a), len(b)) >= FUZZY_MIN_LEN
+            and bounded_edit_distance(a, b, MAX_EDIT_DISTANCE) <= MAX_EDIT_DISTANCE
+            for a in keys for b in other_keys
+        )
+
+    def find(self, kol):
+        """回傳與 kol 重複的既有紀錄（只含 SUMMARY_FIELDS 的 dict），沒有則回傳 None"""
+        keys = self._keys(kol)
+        identity = self._identity(kol)
+        return self._find(keys, identity)
+
+    def _find(self, keys, identity):
+        """從所有 block 收集候選，依加入順序比對，回傳最早加入的重複紀錄"""
+        candidates = set()
+        for block in self._block_keys(keys, identity):
+            members = self.blocks.get(block, ())
+            if block[0] in ('prefix', 'suffix') and len(members) > MAX_BLOCK_SIZE:
+                continue
+            candidates.update(members)
+        for index in sorted(candidates):
+            summary, other_keys, other_identity = self.records[index]
+            if self._same(keys, identity, other_keys, other_identity):
+                return dict(zip(SUMMARY_FIELDS, summary))
+        return None
+
+    def add(self, kol):
+        """紀錄不重複時加入索引並回傳 None，重複時回傳既有紀錄的 SUMMARY_FIELDS（不加入）"""
+        keys = self._keys(kol)
+        identity = self._identity(kol)
+        duplicate = self._find(keys, identity)
+        if duplicate is not None:
+            return duplicate
+        index = len(self.records)
+        summary = tuple(kol.get(field) for field in SUMMARY_FIELDS)
+        self.records.append((summary, keys, identity))
+        for block in self._block_keys(keys, identity):
+            self.blocks.setdefault(block, []).append(index)
+        return None
@@ -0,0 +1,164 @@
+"""
+KOL ↔ 圖片檔名比對
+先比對完整檔名，再比對正規化後的名稱（全形 / 半形統一、去掉括號內容、忽略大小寫與空白），
+最後以 Aho-Corasick 自動機一次找出所有「名稱互相包含」的候選；
+候選不只一位且無法以最長名稱決定時回報為模稜兩可，不再取清單中第一個符合的 KOL
+"""
+
+import re
+import unicodedata
+from collections import deque
+
+# --- 設定區 ---
+MIN_PARTIAL_LEN = 2     # 部分比對時名稱至少要有幾個字，避免單字誤配
+
+def safe_filename(name):
+    """產生安全的檔案名稱"""
+    return re.sub(r'[<>:"/\\|?*]', '_', name)
+
+def fold(name):
+    """NFKC（全形英數與括號轉成半形）後忽略大小寫、空白、括號與檔名中被替換的符號"""
+    key = unicodedata.normalize('NFKC', name).casefold()
+    return re.sub(r'[\s_<>:"/\\|?*()\[\]【】「」]+', '', key)
+
+def normalize_key(name):
+    """
+    完全比對用的正規化名稱
+    比照 extract_clean_name 去掉括號內容與未閉合的括號後綴再 fold；整個名稱都在括號內時保留括號內的文字
+    """
+    key = unicodedata.normalize('NFKC', name)
+    stripped = re.sub(r'\(.*?\)|\[.*?\]|【.*?】|「.*?」', '', key)
+    stripped = re.sub(r'\s*\(.*', '', stripped)
+    return fold(stripped) or fold(key)
+
+class AhoCorasick:
+    """多字串比對自動機：一次掃描文字即可找出所有出現的 pattern"""
+
+    def __init__(self, patterns):
+        # 每個狀態：(轉移表, 失敗連結, 此狀態結束的 pattern 值)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern, value in patterns:
+            self._add(pattern, value)
+        self._build()
+
+    def _add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(value)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                # 失敗連結指向的狀態所結束的 pattern 也是目前狀態的後綴
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """回傳 text 中出現的所有 pattern 值（不重複）"""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            found.update(self.output[state])
+        return found
+
+class KolMatcher:
+    """以 KOL 名單建立索引，把圖片檔名（不含副檔名）對應到 KOL"""
+
+    def __init__(self, kol_list):
+        self.kol_list = kol_list
+        self.by_name = {}
+        self.by_display = {}
+        self.by_key = {}
+        self.keys = []      # (正規化名稱, KOL 索引)
+        self.keys_of = {}   # KOL 索引 → 正規化名稱列表
+        self.folded = []    # (含括號內容的完整名稱, KOL 索引)，供「KOL 名稱包含圖片名稱」比對
+        for index, kol in enumerate(kol_list):
+            self.by_name.setdefault(safe_filename(kol['name']), index)
+            self.by_display.setdefault(safe_filename(kol['display_name']), index)
+            for field in ('name', 'display_name'):
+                key = normalize_key(kol[field])
+                if key:
+                    self.by_key.setdefault(key, set()).add(index)
+                    if len(key) >= MIN_PARTIAL_LEN:
+                        self.keys.append((key, index))
+                        self.keys_of.setdefault(index, []).append(key)
+                self.folded.append((fold(kol[field]), index))
+        self.automaton = AhoCorasick(self.keys)
+
+    def match_all(self, img_names):
+        """
+        回傳 {圖片名稱: (KOL 或 None, 候選 KOL 列表)}
+        KOL 為 None 且候選超過一位表示模稜兩可
+        """
+        results = {}
+        partial = []
+        for img_name in img_names:
+            if img_name in self.by_name:
+                results[img_name] = (self.kol_list[self.by_name[img_name]], [])
+            elif img_name in self.by_display:
+                results[img_name] = (self.kol_list[self.by_display[img_name]], [])
+            else:
+                img_key = normalize_key(img_name)
+                exact = self.by_key.get(img_key, set())
+                if len(exact) == 1:
+                    results[img_name] = (self.kol_list[next(iter(exact))], [])
+                elif exact:
+                    results[img_name] = (None, [self.kol_list[i] for i in sorted(exact)])
+                else:
+                    partial.append((img_name, img_key, fold(img_name)))
+
+        if partial:
+            # 圖片名稱包含 KOL 名稱：以 KOL 名稱建立的自動機掃描完整的圖片名稱（含括號內的真名）
+            # KOL 名稱包含圖片名稱：反過來以圖片名稱建立自動機，每個 KOL 名稱只掃描一次
+            candidates = {img_name: {} for img_name, _, _ in partial}
+            for img_name, _, img_text in partial:
+                for index in self.automaton.find(img_text):
+                    self._add_candidate(candidates[img_name], index, img_text)
+            reverse = AhoCorasick(
+                (img_key, (img_name, img_key)) for img_name, img_key, _ in partial
+                if len(img_key) >= MIN_PARTIAL_LEN
+            )
+            for text, index in self.folded:
+                for img_name, img_key in reverse.find(text):
+                    found = candidates[img_name]
+                    found[index] = max(found.get(index, 0), len(img_key))
+            for img_name, _, _ in partial:
+                results[img_name] = self._pick(candidates[img_name])
+        return results
+
+    def _add_candidate(self, found, index, img_text):
+        """記錄候選 KOL 與其被圖片名稱包含的最長名稱長度"""
+        overlap = max(len(key) for key in self.keys_of[index] if key in img_text)
+        found[index] = max(found.get(index, 0), overlap)
+
+    def _pick(self, found):
+        """重疊最長的候選唯一時採用，否則回報模稜兩可"""
+        if not found:
+            return None, []
+        best = max(found.values())
+        top = sorted(i for i, overlap in found.items() if overlap == best)
+        if len(top) == 1:
+            return self.kol_list[top[0]], []
+        return None, [self.kol_list[i] for i in top]
+
+    def match(self, img_name):
+        return self.match_all([img_name])[img_name]
@@ -1,8 +1,8 @@
 import os
 import json
-import requests
-from duckduckgo_search import DDGS
-from datetime import datetime
+from avatar_store import get_avatar_store
+from avatar_download import download_image
+from image_search import close_image_search, get_image_search
 
 # --- 設定區 ---
 # 從清洗後的 JSON 讀取 KOL 名單
@@ -18,48 +18,33 @@ HTML_FILENAME = "index.html"
 if not os.path.exists(DOWNLOAD_DIR):
     os.makedirs(DOWNLOAD_DIR)
 
-def download_image(name, url):
-    """下載圖片並儲存到本地"""
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            # 取得副檔名，預設為 jpg
-            ext = ".jpg"
-            filename = f"{name}{ext}"
-            filepath = os.path.join(DOWNLOAD_DIR, filename)
-            
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            return filepath
-    except Exception as e:
-        print(f"下載 {name} 失敗: {e}")
-    return None
-
 def search_and_save_kols():
     kol_data = []
     total = len(KOL_NAMES)
+    search = get_image_search()
+    
+    # 搜尋關鍵字加上 'profile picture' 提高精確度；所有查詢先並行送出（結果有快取）
+    queries = [f"{display_name} KOL profile picture portrait" for display_name, _ in KOL_NAMES]
+    searched = search.search_many(queries)
+    
+    for idx, ((display_name, clean_name), (results, error)) in enumerate(zip(KOL_NAMES, searched), 1):
+        print(f"[{idx}/{total}] 正在搜尋 {display_name} 的頭像...")
+        if error:
+            print(f"    ✗ 搜尋 {display_name} 時發生錯誤: {error}")
+            continue
+        if not results:
+            print(f"    ✗ 找不到 {display_name} 的圖片")
+            continue
+        # 以 clean_name 存檔（與兩支抓取工具相同的 key 與檔名）；候選依尺寸 / 比例 / 網域排序，下載失敗時改用下一個
+        local_path, _ = search.download_best(results, lambda url: download_image(clean_name, url))
+        if local_path:
+            kol_data.append({"name": display_name, "path": local_path})
+            print(f"    ✓ 成功儲存: {display_name}")
+        else:
+            print(f"    ✗ {display_name} 的 {len(results)} 個候選圖片都下載失敗")
     
-    with DDGS() as ddgs:
-        for idx, (display_name, clean_name) in enumerate(KOL_NAMES, 1):
-            print(f"[{idx}/{total}] 正在搜尋 {display_name} 的頭像...")
-            # 搜尋關鍵字加上 'profile picture' 提高精確度
-            search_query = f"{display_name} KOL profile picture portrait"
-            try:
-                results = ddgs.images(search_query, max_results=1)
-                
-                if results:
-                    image_url = results[0]['image']
-                    # 使用 clean_name 作為檔名（避免特殊字元）
-                    safe_filename = clean_name.replace('/', '_').replace('\\', '_').replace(':', '_')
-                    local_path = download_image(safe_filename, image_url)
-                    if local_path:
-                        kol_data.append({"name": display_name, "path": local_path})
-                        print(f"    ✓ 成功儲存: {display_name}")
-                else:
-                    print(f"    ✗ 找不到 {display_name} 的圖片")
-            except Exception as e:
-                print(f"    ✗ 搜尋 {display_name} 時發生錯誤: {e}")
-                
+    close_image_search()
+    get_avatar_store().compact()
     return kol_data
 
 def generate_html(kol_data):
@@ -0,0 +1,211 @@
+"""
+抓取流程的分段計時與指標
+每位 KOL 的各階段（parse / resolve / download / write）以 span 記錄耗時、位元組數、HTTP 狀態與平台，
+逐筆寫入 JSONL；執行結束時依平台與階段彙整 p50 / p95 / p99，並可輸出 Prometheus 文字格式
+只有呼叫 start_metrics() 之後才會記錄，其他情況下 span() 不做任何事
+"""
+
+import json
+import math
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- 設定區 ---
+METRICS_FILE = "fetch_metrics.jsonl"
+PROMETHEUS_FILE = "fetch_metrics.prom"
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 目前所在的 span（每個 thread / asyncio task 各自獨立，子 span 繼承 kol 與 platform）
+_current_span = contextvars.ContextVar('metrics_span', default=None)
+
+def percentile(values, q):
+    """nearest-rank 百分位數，values 需已排序"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+class ChunkTimer:
+    """包住 iter_content，分開統計等待網路的時間與收到的位元組數"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.wait = 0.0
+        self.bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            chunk = next(self.chunks)
+        finally:
+            self.wait += time.perf_counter() - start
+        self.bytes += len(chunk)
+        return chunk
+
+class MetricsRecorder:
+    """收集 span 並逐筆寫入 JSONL（thread-safe）"""
+
+    def __init__(self, path=METRICS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.spans = []
+        self.file = open(self.path, 'w', encoding='utf-8') if path else None
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+            if self.file:
+                self.file.write(json.dumps(span, ensure_ascii=False) + '\n')
+                self.file.flush()
+
+    def groups(self):
+        """依 (平台, 階段) 分組，另外每個階段加上 platform='all' 的合計"""
+        groups = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            for platform in (span.get('platform') or 'unknown', 'all'):
+                groups.setdefault((platform, span['stage']), []).append(span)
+        return groups
+
+    def summary(self):
+        """回傳 [(平台, 階段, 次數, p50, p95, p99, 位元組, 錯誤數)]，時間單位為秒"""
+        rows = []
+        for (platform, stage), spans in sorted(self.groups().items()):
+            durations = sorted(span['duration'] for span in spans)
+            rows.append((
+                platform, stage, len(spans),
+                *(percentile(durations, q) for q in QUANTILES),
+                sum(span.get('bytes', 0) for span in spans),
+                sum(1 for span in spans if span.get('error')),
+            ))
+        return rows
+
+    def print_summary(self):
+        print("各階段耗時 (秒):")
+        print(f"  {'平台':<10} {'階段':<9} {'次數':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'KB':>9} {'錯誤':>4}")
+        for platform, stage, count, p50, p95, p99, size, errors in self.summary():
+            print(f"  {platform:<10} {stage:<9} {count:>5} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f} "
+                  f"{size / 1024:>9.1f} {errors:>4}")
+
+    def prometheus_text(self):
+        """Prometheus text exposition 格式（summary + counters）"""
+        lines = [
+            '# HELP kol_fetch_stage_seconds Duration of each fetch stage per KOL.',
+            '# TYPE kol_fetch_stage_seconds summary',
+        ]
+        groups = {key: spans for key, spans in self.groups().items() if key[0] != 'all'}
+        for (platform, stage), spans in sorted(groups.items()):
+            labels = f'platform="{platform}",stage="{stage}"'
+            durations = sorted(span['duration'] for span in spans)
+            for q in QUANTILES:
+                lines.append(f'kol_fetch_stage_seconds{{{labels},quantile="{q}"}} {percentile(durations, q)}')
+            lines.append(f'kol_fetch_stage_seconds_sum{{{labels}}} {round(sum(durations), 6)}')
+            lines.append(f'kol_fetch_stage_seconds_count{{{labels}}} {len(durations)}')
+        lines += [
+            '# HELP kol_fetch_bytes_total Bytes received per fetch stage.',
+            '# TYPE kol_fetch_bytes_total counter',
+        ]
+        for (platform, stage), spans in sorted(groups.items()):
+            total = sum(span.get('bytes', 0) for span in spans)
+            lines.append(f'kol_fetch_bytes_total{{platform="{platform}",stage="{stage}"}} {total}')
+        statuses = {}
+        for (platform, _), spans in groups.items():
+            for span in spans:
+                if span.get('status') is not None:
+                    key = (platform, span['status'])
+                    statuses[key] = statuses.get(key, 0) + 1
+        lines += [
+            '# HELP kol_fetch_http_responses_total Last HTTP status seen by each span.',
+            '# TYPE kol_fetch_http_responses_total counter',
+        ]
+        for (platform, status), count in sorted(statuses.items()):
+            lines.append(f'kol_fetch_http_responses_total{{platform="{platform}",status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=PROMETHEUS_FILE):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def start_metrics(path=METRICS_FILE):
+    """開始記錄本次執行的指標（覆寫上次的 JSONL），回傳 MetricsRecorder"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is not None:
+            _metrics.close()
+        _metrics = MetricsRecorder(path)
+    return _metrics
+
+def get_metrics():
+    """目前的 MetricsRecorder，尚未 start_metrics() 時為 None"""
+    return _metrics
+
+@contextmanager
+def span(stage, **fields):
+    """
+    記錄一個階段的耗時；yield 出的 dict 可再補上欄位（如 platform、bytes）
+    kol / platform 沒有指定時沿用外層 span；發生例外時記下例外類別後照常拋出
+    """
+    parent = _current_span.get()
+    current = {
+        'stage': stage,
+        'kol': parent.get('kol') if parent else None,
+        'platform': parent.get('platform') if parent else None,
+    }
+    current.update(fields)
+    token = _current_span.set(current)
+    current['ts'] = time.time()
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current['error'] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        elapsed = time.perf_counter() - start - current.pop('excluded', 0.0)
+        current['duration'] = round(max(elapsed, 0.0), 6)
+        recorder = _metrics
+        if recorder is not None:
+            recorder.record(current)
+
+def note_response(status_code):
+    """由 http_client 呼叫：把 HTTP 狀態記到目前的 span"""
+    current = _current_span.get()
+    if current is not None:
+        current['status'] = status_code
+        current['requests'] = current.get('requests', 0) + 1
+
+def record_write(chunks, elapsed):
+    """
+    save_stream 結束後呼叫：總耗時扣掉等待網路的時間即為寫檔時間，
+    另記一個 write span，並從目前的 download span 扣除
+    """
+    write_time = max(0.0, elapsed - chunks.wait)
+    current = _current_span.get()
+    if current is not None:
+        current['bytes'] = current.get('bytes', 0) + chunks.bytes
+        current['excluded'] = current.get('excluded', 0.0) + write_time
+    recorder = _metrics
+    if recorder is not None:
+        recorder.record({
+            'stage': 'write',
+            'kol': current.get('kol') if current else None,
+            'platform': current.get('platform') if current else None,
+            'ts': time.time(),
+            'bytes': chunks.bytes,
+            'duration': round(write_time, 6),
+        })
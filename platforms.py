@@ -0,0 +1,206 @@
+"""
+各社群平台的頭像抓取方法與預設的解析器註冊表
+Instagram / Facebook / YouTube 的抓取邏輯集中在這裡（網址解析規則在 social_links），
+kol_avatar_fetcher 與 kol_avatar_selenium 共用同一條分派路徑
+"""
+
+import re
+import threading
+
+import http_client
+from http_client import HEADERS
+from rate_limiter import get_rate_limiter
+from resolve_cache import get_resolve_cache
+from resolver_registry import ResolverRegistry
+from social_links import (
+    PLATFORM_HOSTS, extract_facebook_id, extract_instagram_username, extract_youtube_channel, host_matcher,
+)
+from tiered_resolver import Strategy
+
+# ==================== Instagram ====================
+
+# Instagram loader 全域變數
+_insta_loader = None
+_insta_loader_lock = threading.Lock()
+
+def get_instaloader():
+    """取得或建立 instaloader 實例（帶登入）；並行模式下多個 Instagram 執行緒只會登入一次"""
+    global _insta_loader
+    if _insta_loader is None:
+        with _insta_loader_lock:
+            if _insta_loader is None:
+                try:
+                    import instaloader
+                except ImportError:
+                    print("    [IG] instaloader 未安裝")
+                    return None
+                loader = instaloader.Instaloader()
+                # 嘗試登入（登入完成後才公開給其他執行緒）
+                try:
+                    loader.login('kingway_publishing', 'Cmoney1234')
+                    print("    [IG] 登入成功")
+                except Exception as e:
+                    print(f"    [IG] 登入失敗，使用匿名模式: {e}")
+                _insta_loader = loader
+    return _insta_loader
+
+def fetch_instagram_instaloader(url):
+    """使用 instaloader 取得 Instagram 頭像（更穩定）"""
+    username = extract_instagram_username(url)
+    if not username:
+        return None
+    
+    try:
+        loader = get_instaloader()
+        if loader:
+            import instaloader
+            get_rate_limiter().acquire(platform='Instagram')
+            profile = instaloader.Profile.from_username(loader.context, username)
+            return profile.profile_pic_url
+    except Exception as e:
+        get_rate_limiter().report_exception(e, platform='Instagram')
+    return None
+
+def fetch_instagram_og_image(url):
+    """從 Instagram 頁面 HTML 解析 og:image"""
+    username = extract_instagram_username(url)
+    if not username:
+        return None
+    
+    try:
+        profile_url = f"https://www.instagram.com/{username}/"
+        response = http_client.get(profile_url, headers=HEADERS, timeout=10, platform='Instagram')
+        if response.status_code == 200:
+            match = re.search(r'<meta property="og:image" content="([^"]+)"', response.text)
+            if match:
+                return match.group(1)
+    except:
+        pass
+    return None
+
+def fetch_instagram_avatar(url):
+    """從 Instagram 抓取頭像"""
+    return fetch_instagram_instaloader(url) or fetch_instagram_og_image(url)
+
+# ==================== Facebook ====================
+
+def fetch_facebook_graph_picture(url):
+    """以 Graph API 風格 URL 取得頭像（僅適用數字 ID）"""
+    fb_id = extract_facebook_id(url)
+    if not fb_id or not fb_id.isdigit():
+        return None
+    
+    try:
+        avatar_url = f"https://graph.facebook.com/{fb_id}/picture?type=large"
+        response = http_client.get(avatar_url, headers=HEADERS, timeout=10, allow_redirects=True, platform='Facebook')
+        if response.status_code == 200 and len(response.content) > 1000:
+            return response.url
+    except:
+        pass
+    return None
+
+def fetch_facebook_og_image(url):
+    """從 Facebook 頁面 HTML 解析 og:image"""
+    if not extract_facebook_id(url):
+        return None
+    
+    try:
+        response, cached = get_resolve_cache().fetch_page(url, 'Facebook')
+        if cached:
+            return cached
+        if response.status_code == 200:
+            match = re.search(r'<meta property="og:image" content="([^"]+)"', response.text)
+            if match:
+                return match.group(1)
+    except:
+        pass
+    return None
+
+def fetch_facebook_avatar(url):
+    """從 Facebook 抓取頭像"""
+    return fetch_facebook_graph_picture(url) or fetch_facebook_og_image(url)
+
+# ==================== YouTube ====================
+
+def fetch_youtube_avatar(url):
+    """從 YouTube 抓取頭像"""
+    try:
+        response, cached = get_resolve_cache().fetch_page(url, 'YouTube')
+        if cached:
+            return cached
+        if response.status_code == 200:
+            # 抓取頻道頭像 URL
+            match = re.search(r'"avatar":\{"thumbnails":\[\{"url":"([^"]+)"', response.text)
+            if match:
+                return match.group(1).replace('\\u0026', '&')
+            # 備用方法
+            match = re.search(r'<link rel="image_src" href="([^"]+)"', response.text)
+            if match:
+                return match.group(1)
+    except:
+        pass
+    return None
+
+# ==================== 註冊表 ====================
+
+def is_numeric_facebook_id(url):
+    return (extract_facebook_id(url) or '').isdigit()
+
+def build_registry():
+    """
+    建立預設的平台註冊表（不含瀏覽器方法）
+    各入口可再以 add_strategy 加入自己的方法，例如 Selenium
+    """
+    registry = ResolverRegistry()
+    registry.register('Instagram', host_matcher(*PLATFORM_HOSTS['Instagram']), extract_instagram_username, [
+        # og:image 常是低解析度或登入牆圖片，只作為 instaloader 的備援
+        Strategy('instaloader', fetch_instagram_instaloader, cost=1),
+        Strategy('og_image', fetch_instagram_og_image, cost=2),
+    ])
+    registry.register('Facebook', host_matcher(*PLATFORM_HOSTS['Facebook']), extract_facebook_id, [
+        Strategy('graph_picture', fetch_facebook_graph_picture, cost=1, applies=is_numeric_facebook_id),
+        Strategy('og_image', fetch_facebook_og_image, cost=1),
+    ])
+    registry.register('YouTube', host_matcher(*PLATFORM_HOSTS['YouTube']), extract_youtube_channel, [
+        Strategy('channel_page', fetch_youtube_avatar, cost=1),
+    ])
+    # Twitter/X 需要登入，暫不支援（只用來辨識平台）
+    registry.register('X/Twitter', host_matcher(*PLATFORM_HOSTS['X/Twitter']))
+    return registry
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """
+    取得全域共用的平台註冊表（首次呼叫時以 build_registry 建立）
+    同一個行程的所有入口共用同一份命中率統計；入口加入的方法（例如 Selenium）對整個行程生效
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = build_registry()
+    return _registry
+
+def fetch_avatar_by_platform(social_link, registry, exclude=()):
+    """
+    取得社群連結的頭像 URL，回傳 (頭像 URL, 平台)
+    先查 resolve cache：有效期內直接命中，否則交給註冊表抓取並寫回快取
+    （過期紀錄由抓取方法以條件式請求取得頁面，304 時沿用快取的頭像 URL，不會重複請求同一頁）；
+    exclude 為已判定無效（預設頭像 / 重複）的頭像 URL，快取中是這些 URL 時捨棄紀錄並重新解析
+    """
+    if not social_link or not social_link.startswith('http'):
+        return None, None
+    
+    cache = get_resolve_cache()
+    entry = cache.get(social_link)
+    if entry and entry['avatar_url'] in exclude:
+        cache.delete(social_link)
+    elif cache.is_fresh(entry):
+        return entry['avatar_url'], entry['platform']
+    
+    avatar_url, platform = registry.resolve(social_link, exclude)
+    if avatar_url:
+        cache.put(social_link, platform, avatar_url)
+    return avatar_url, platform
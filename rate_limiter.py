@@ -0,0 +1,157 @@
+"""
+平台 / 主機級速率限制
+每個平台與每個主機各有一個 token bucket，取代固定的 sleep；
+遇到 429/503（或附帶 Retry-After 的 403）時自動降速並遵守 Retry-After，成功後再逐步恢復
+"""
+
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# --- 設定區 ---
+# 各平台的 (每秒請求數, 突發容量)
+PLATFORM_RATES = {
+    'Instagram': (0.5, 2),
+    'Facebook': (1.0, 3),
+    'YouTube': (2.0, 5),
+    'DuckDuckGo': (0.5, 1),
+}
+DEFAULT_PLATFORM_RATE = (1.0, 3)
+# 每個主機（含 CDN）的 (每秒請求數, 突發容量)
+DEFAULT_HOST_RATE = (5.0, 10)
+
+MIN_RATE = 0.05         # 降速後的最低速率 (req/s)
+BACKOFF_FACTOR = 0.5    # 每次被擋時速率乘上的倍數
+RECOVERY_STEP = 0.05    # 每次成功請求恢復的速率 (req/s)
+MAX_RETRY_AFTER = 300   # Retry-After 最多等待秒數
+
+THROTTLE_STATUS = (429, 503)   # 一律視為限流；403 只有附帶 Retry-After 時才算（否則多半是權限或已刪除的帳號）
+
+def parse_retry_after(value):
+    """解析 Retry-After（秒數或 HTTP 日期），回傳秒數或 None"""
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return min(int(value), MAX_RETRY_AFTER)
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0, min(retry_at.timestamp() - time.time(), MAX_RETRY_AFTER))
+    except (TypeError, ValueError):
+        return None
+
+def is_throttled(status_code, retry_after=None):
+    """回應是否代表被限流（需要降速並稍後重試）"""
+    return status_code in THROTTLE_STATUS or (status_code == 403 and bool(retry_after))
+
+class TokenBucket:
+    """可動態調整速率的 token bucket（thread-safe）"""
+
+    def __init__(self, rate, capacity):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """預約一個 token，回傳需要等待的秒數"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        """被限流時降速，並在 Retry-After（或一個新間隔）內暫停發送"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(MIN_RATE, self.rate * BACKOFF_FACTOR)
+            self.tokens = min(self.tokens, 0)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, now + pause)
+
+    def reward(self):
+        """請求成功時逐步把速率調回原本設定"""
+        with self.lock:
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + RECOVERY_STEP)
+
+class RateLimiter:
+    """依平台與主機分別管理 token bucket"""
+
+    def __init__(self, platform_rates=None, host_rate=DEFAULT_HOST_RATE):
+        self.platform_rates = dict(PLATFORM_RATES if platform_rates is None else platform_rates)
+        self.host_rate = host_rate
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, kind, key):
+        with self.lock:
+            bucket = self.buckets.get((kind, key))
+            if bucket is None:
+                if kind == 'platform':
+                    rate, capacity = self.platform_rates.get(key, DEFAULT_PLATFORM_RATE)
+                else:
+                    rate, capacity = self.host_rate
+                bucket = TokenBucket(rate, capacity)
+                self.buckets[(kind, key)] = bucket
+            return bucket
+
+    def _targets(self, platform, url):
+        targets = []
+        if platform:
+            targets.append(self._bucket('platform', platform))
+        if url:
+            host = urlparse(url).hostname
+            if host:
+                targets.append(self._bucket('host', host.lower()))
+        return targets
+
+    def acquire(self, platform=None, url=None):
+        """等到平台與主機兩個 bucket 都有 token 為止"""
+        waits = [bucket.reserve() for bucket in self._targets(platform, url)]
+        wait = max(waits, default=0)
+        if wait > 0:
+            time.sleep(wait)
+
+    def report(self, status_code, platform=None, url=None, retry_after=None):
+        """回報請求結果：被限流時降速，其餘成功回應逐步恢復"""
+        throttled = is_throttled(status_code, retry_after)
+        for bucket in self._targets(platform, url):
+            if throttled:
+                bucket.penalize(parse_retry_after(retry_after))
+            elif status_code < 400:
+                bucket.reward()
+
+    def report_exception(self, error, platform=None, url=None):
+        """第三方套件（instaloader、DDGS）以例外表示限流時，視同 429"""
+        name = type(error).__name__.lower()
+        if 'ratelimit' in name or 'toomanyrequests' in name or '429' in str(error):
+            self.report(429, platform=platform, url=url)
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """取得全域共用的 RateLimiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -3,87 +3,76 @@
 """
 
 import os
+import sys
 import json
-import re
 from datetime import datetime
 
+from build_cache import BuildCache
+from fetch_engine import detect_platform
+from kol_matcher import KolMatcher
+from search_index import build_search_index
+from thumbnails import CARD_SIZE, SCALES, THUMB_DIR, build_thumbnails, output_formats
+
 DOWNLOAD_DIR = "kol_avatars"
 HTML_FILENAME = "index.html"
 KOL_DATA_FILE = r'd:\google antigravity\kolphoto\kol_list_cleaned.json'
+BADGE_PLATFORMS = ('Instagram', 'Facebook', 'YouTube')    # 有專屬標籤樣式的平台，其餘顯示為 Manual
 
-def safe_filename(name):
-    return re.sub(r'[<>:"/\\|?*]', '_', name)
-
-# 讀取 KOL 資料
-with open(KOL_DATA_FILE, 'r', encoding='utf-8') as f:
-    kol_list = json.load(f)
+def match_images():
+    """讀取 KOL 資料並把 kol_avatars/ 中的每張圖片對應到 KOL"""
+    # 讀取 KOL 資料
+    with open(KOL_DATA_FILE, 'r', encoding='utf-8') as f:
+        kol_list = json.load(f)
 
-# 取得所有已有的圖片
-existing_images = {}
-for f in os.listdir(DOWNLOAD_DIR):
-    name = os.path.splitext(f)[0]
-    existing_images[name] = os.path.join(DOWNLOAD_DIR, f)
+    # 取得所有已有的圖片
+    existing_images = {}
+    for f in os.listdir(DOWNLOAD_DIR):
+        # 略過 avatar_store 寫入中的暫存檔
+        if f.startswith('.tmp-'):
+            continue
+        name = os.path.splitext(f)[0]
+        existing_images[name] = os.path.join(DOWNLOAD_DIR, f)
 
-print(f"找到 {len(existing_images)} 張圖片")
+    print(f"找到 {len(existing_images)} 張圖片")
 
-# 建立多種匹配索引
-name_to_kol = {}
-display_to_kol = {}
-for kol in kol_list:
-    name_to_kol[safe_filename(kol['name'])] = kol
-    display_to_kol[safe_filename(kol['display_name'])] = kol
+    # 以共用的比對索引一次對應所有圖片
+    matches = KolMatcher(kol_list).match_all(existing_images)
 
-# 匹配 KOL 與圖片
-results = []
-matched_images = set()
+    # 匹配 KOL 與圖片
+    results = []
+    matched_images = set()
 
-for img_name, img_path in existing_images.items():
-    kol = None
-    
-    # 優先用 name 匹配
-    if img_name in name_to_kol:
-        kol = name_to_kol[img_name]
-    # 其次用 display_name 匹配
-    elif img_name in display_to_kol:
-        kol = display_to_kol[img_name]
-    else:
-        # 部分匹配：檢查圖片名稱是否包含 KOL name 或反之
-        for k in kol_list:
-            safe_name = safe_filename(k['name'])
-            safe_display = safe_filename(k['display_name'])
-            if (safe_name in img_name or img_name in safe_name or 
-                safe_display in img_name or img_name in safe_display):
-                kol = k
-                break
+    for img_name, img_path in existing_images.items():
+        kol, candidates = matches[img_name]
+        if candidates:
+            names = '、'.join(k['display_name'] for k in candidates)
+            print(f"  [模稜兩可] {img_name} 可能是：{names}")
     
-    if kol:
-        social_link = kol.get('social_link', '').lower()
-        platform = 'Manual'
-        if 'instagram' in social_link:
-            platform = 'Instagram'
-        elif 'facebook' in social_link:
-            platform = 'Facebook'
-        elif 'youtube' in social_link:
-            platform = 'YouTube'
+        if kol:
+            platform = detect_platform(kol.get('social_link', ''))
+            if platform not in BADGE_PLATFORMS:
+                platform = 'Manual'
         
-        results.append({
-            'display_name': kol['display_name'],
-            'clean_name': kol['name'],
-            'path': img_path,
-            'platform': platform
-        })
-        matched_images.add(img_name)
-    else:
-        # 未匹配的圖片，用圖片名稱作為顯示名稱
-        results.append({
-            'display_name': img_name,
-            'clean_name': img_name,
-            'path': img_path,
-            'platform': 'Manual'
-        })
-        print(f"  [新增] {img_name} (無 JSON 資料，使用圖片名稱)")
+            results.append({
+                'display_name': kol['display_name'],
+                'clean_name': kol['name'],
+                'path': img_path,
+                'platform': platform
+            })
+            matched_images.add(img_name)
+        else:
+            # 未匹配的圖片，用圖片名稱作為顯示名稱
+            results.append({
+                'display_name': img_name,
+                'clean_name': img_name,
+                'path': img_path,
+                'platform': 'Manual'
+            })
+            print(f"  [新增] {img_name} (無 JSON 資料，使用圖片名稱)")
+
+    print(f"匹配成功 {len(results)} 位 KOL")
+    return results
 
-print(f"匹配成功 {len(results)} 位 KOL")
 
 # A區優先名單
 priority_list = [
@@ -112,13 +101,6 @@ def get_priority(kol):
             return (0, i)  # A區，按名單順序
     return (1, display)  # B區，按名稱排序
 
-results.sort(key=get_priority)
-
-# 分區結果
-a_zone = [k for k in results if get_priority(k)[0] == 0]
-b_zone = [k for k in results if get_priority(k)[0] == 1]
-print(f"A區: {len(a_zone)} 位, B區: {len(b_zone)} 位")
-
 # 生成 HTML
 css_style = """
 <style>
@@ -178,6 +160,11 @@ css_style = """
         aspect-ratio: 1 / 1;
         overflow: hidden;
     }
+    .card picture {
+        display: block;
+        width: 100%;
+        height: 100%;
+    }
     .card img {
         width: 100%;
         height: 100%;
@@ -272,6 +259,23 @@ css_style = """
 """
 
 
+def generate_img_html(kol, alt):
+    """有縮圖時輸出 <picture>（AVIF / WebP + JPEG srcset），否則直接引用原圖"""
+    thumbs = kol.get('thumbs')
+    if not thumbs:
+        return f'<img src="{kol["path"]}" alt="{alt}" loading="lazy">'
+    
+    sources = "".join(
+        f'<source type="image/{fmt}" srcset="{x1} 1x, {x2} 2x">'
+        for fmt, (x1, x2) in thumbs.items() if fmt != 'jpg'
+    )
+    x1, x2 = thumbs['jpg']
+    return (
+        f'<picture>{sources}'
+        f'<img src="{x1}" srcset="{x1} 1x, {x2} 2x" width="{CARD_SIZE}" height="{CARD_SIZE}" '
+        f'alt="{alt}" loading="lazy"></picture>'
+    )
+
 def generate_card_html(kol):
     platform = kol.get('platform', 'Manual')
     platform_class = f"platform-{platform.lower()}"
@@ -286,7 +290,7 @@ def generate_card_html(kol):
     return f"""
     <div class="card" data-name="{display_name} {clean_name}">
         <div class="img-wrapper">
-            <img src="{kol['path']}" alt="{display_name}" loading="lazy">
+            {generate_img_html(kol, display_name)}
         </div>
         <div class="card-body">
             {name_html}
@@ -295,18 +299,71 @@ def generate_card_html(kol):
     </div>
     """
 
-# 生成 A區 卡片
-a_zone_cards = ""
-for kol in a_zone:
-    a_zone_cards += generate_card_html(kol)
+# 兩種版面共用的搜尋：建置時產生的倒排索引（search_index.py），查詢切詞後取各詞 posting list 的交集
+search_script = """
+<script>
+// 回傳 lookup(query)：符合的卡片編號（遞增）；查詢沒有可用的詞時回傳 null 表示全部
+function createSearch(search) {
+    const tokenRe = new RegExp(search.tokenPattern, 'g');
+    const cjkRe = new RegExp('^' + search.cjkPattern);
 
-# 生成 B區 卡片
-b_zone_cards = ""
-for kol in b_zone:
-    b_zone_cards += generate_card_html(kol)
+    // 與 search_index.py 相同的切詞：CJK 單字或雙字詞；其他字詞整段查詢，
+    // 超過 maxPrefix 時改查每個長度 maxPrefix 的片段（索引含這個長度以內的所有子字串）
+    function queryTerms(query) {
+        const terms = [];
+        (query.normalize('NFKC').toLowerCase().match(tokenRe) || []).forEach(token => {
+            if (cjkRe.test(token)) {
+                if (token.length === 1) terms.push(token);
+                for (let i = 0; i + 1 < token.length; i++) terms.push(token.slice(i, i + 2));
+            } else {
+                const n = Math.min(token.length, search.maxPrefix);
+                for (let i = 0; i + n <= token.length; i++) terms.push(token.slice(i, i + n));
+            }
+        });
+        return terms;
+    }
+
+    function intersect(a, b) {
+        const result = [];
+        let i = 0, j = 0;
+        while (i < a.length && j < b.length) {
+            if (a[i] === b[j]) { result.push(a[i]); i++; j++; }
+            else if (a[i] < b[j]) i++;
+            else j++;
+        }
+        return result;
+    }
+
+    return function lookup(query) {
+        const terms = queryTerms(query);
+        if (!terms.length) return null;
+        const lists = terms.map(term => search.terms[term] || []).sort((a, b) => a.length - b.length);
+        let result = lists[0];
+        for (let k = 1; k < lists.length && result.length; k++) {
+            result = intersect(result, lists[k]);
+        }
+        return result;
+    };
+}
+</script>
+"""
+
+def card_search_index(a_zone, b_zone):
+    """依 A區、B區 順序為卡片編號的搜尋索引"""
+    return build_search_index([[kol['display_name'], kol['clean_name']] for kol in a_zone + b_zone])
+
+def embed_json(data):
+    """精簡 JSON，並避免資料中的 </script> 提早結束區塊"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
 
+def generate_grid_html(results, a_zone, b_zone, cache):
+    """一次輸出所有卡片的版面"""
+    a_zone_cards = "".join(cache.fragment(kol, generate_card_html) for kol in a_zone)
+    b_zone_cards = "".join(cache.fragment(kol, generate_card_html) for kol in b_zone)
+    print(f"重新產生 {cache.rendered} 張卡片，沿用 {len(results) - cache.rendered} 張")
+    search_json = embed_json(card_search_index(a_zone, b_zone))
 
-full_html = f"""<!DOCTYPE html>
+    full_html = f"""<!DOCTYPE html>
 <html lang="zh-TW">
 <head>
     <meta charset="UTF-8">
@@ -329,15 +386,21 @@ full_html = f"""<!DOCTYPE html>
     <div class="grid-container">
         {b_zone_cards}
     </div>
+    <script id="searchIndex" type="application/json">{search_json}</script>
+    {search_script}
     <script>
+        // 卡片在頁面中的順序即搜尋索引的編號（A區、B區 依序）
+        const lookup = createSearch(JSON.parse(document.getElementById('searchIndex').textContent));
+        const cards = Array.from(document.querySelectorAll('.card'));
+
         function filterCards() {{
-            const query = document.getElementById('searchInput').value.toLowerCase();
-            const cards = document.querySelectorAll('.card');
+            const query = document.getElementById('searchInput').value;
+            const hits = lookup(query);
+            const visible = hits ? new Set(hits) : null;
             let visibleCount = 0;
             
-            cards.forEach(card => {{
-                const name = card.getAttribute('data-name').toLowerCase();
-                if (name.includes(query)) {{
+            cards.forEach((card, index) => {{
+                if (!visible || visible.has(index)) {{
                     card.classList.remove('hidden');
                     visibleCount++;
                 }} else {{
@@ -361,8 +424,300 @@ full_html = f"""<!DOCTYPE html>
     </script>
 </body>
 </html>"""
+    return full_html
+
+# 虛擬化版面：只掛載可視範圍內的卡片列
+virtual_css = """
+<style>
+    .virtual-grid {
+        position: relative;
+        max-width: 1200px;
+        margin: 0 auto;
+    }
+    .virtual-row {
+        position: absolute;
+        left: 0;
+        right: 0;
+        display: grid;
+        gap: 20px;
+    }
+    .virtual-row .section-title {
+        margin: 0;
+        width: 100%;
+        grid-column: 1 / -1;
+    }
+    .virtual-row .card-body {
+        height: 80px;
+    }
+    .virtual-row .no-results {
+        grid-column: 1 / -1;
+    }
+    @media (max-width: 768px) {
+        .virtual-row { gap: 12px; }
+    }
+</style>
+"""
+
+virtual_script = """
+<script>
+(function () {
+    const data = JSON.parse(document.getElementById('kolData').textContent);
+    const cards = data.cards;
+    const grid = document.getElementById('virtualGrid');
+    const input = document.getElementById('searchInput');
+    const MIN_CARD = 160;
+    const BODY_HEIGHT = 80;
+    const HEADER_HEIGHT = 70;
+    const OVERSCAN = 2;
+    const DEBOUNCE_MS = 150;
+
+    const lookup = createSearch(data.search);
+    let matched = cards.map((_, i) => i);
+    let rows = [];
+    let mounted = new Map();
+    let columns = 1;
+    let scheduled = false;
+
+    function thumbUrl(id, scale, fmt) {
+        return data.thumbDir + '/' + id + '-' + (data.cardSize * scale) + '.' + fmt;
+    }
+
+    function srcset(id, fmt) {
+        return data.scales.map(s => thumbUrl(id, s, fmt) + ' ' + s + 'x').join(', ');
+    }
+
+    function createCard(index) {
+        const [display, clean, platform, src, thumb] = cards[index];
+        const card = document.createElement('div');
+        card.className = 'card';
+        const wrapper = document.createElement('div');
+        wrapper.className = 'img-wrapper';
+        const img = document.createElement('img');
+        img.alt = display;
+        img.loading = 'lazy';
+        if (thumb) {
+            const picture = document.createElement('picture');
+            data.thumbFormats.filter(fmt => fmt !== 'jpg').forEach(fmt => {
+                const source = document.createElement('source');
+                source.type = 'image/' + fmt;
+                source.srcset = srcset(thumb, fmt);
+                picture.appendChild(source);
+            });
+            img.src = thumbUrl(thumb, 1, 'jpg');
+            img.srcset = srcset(thumb, 'jpg');
+            img.width = img.height = data.cardSize;
+            picture.appendChild(img);
+            wrapper.appendChild(picture);
+        } else {
+            img.src = src;
+            wrapper.appendChild(img);
+        }
+        const body = document.createElement('div');
+        body.className = 'card-body';
+        const title = document.createElement('h3');
+        title.textContent = display;
+        body.appendChild(title);
+        if (clean) {
+            const realName = document.createElement('p');
+            realName.className = 'real-name';
+            realName.textContent = '(' + clean + ')';
+            body.appendChild(realName);
+        }
+        const badge = document.createElement('span');
+        badge.className = 'platform-badge platform-' + platform.toLowerCase();
+        badge.textContent = platform;
+        body.appendChild(badge);
+        card.appendChild(wrapper);
+        card.appendChild(body);
+        return card;
+    }
+
+    // 依目前寬度與搜尋結果把卡片切成固定高度的列
+    function layout() {
+        const width = grid.clientWidth;
+        const gap = window.innerWidth <= 768 ? 12 : 20;
+        columns = window.innerWidth <= 768 ? 2 : Math.max(1, Math.floor((width + gap) / (MIN_CARD + gap)));
+        const cardHeight = (width - gap * (columns - 1)) / columns + BODY_HEIGHT;
+        rows = [];
+        let top = 0;
+        let start = 0;
+        data.sections.forEach(([title, end]) => {
+            const members = [];
+            while (start < matched.length && matched[start] < end) {
+                members.push(matched[start++]);
+            }
+            if (!members.length) return;
+            rows.push({top: top, height: HEADER_HEIGHT, header: title});
+            top += HEADER_HEIGHT;
+            for (let i = 0; i < members.length; i += columns) {
+                rows.push({top: top, height: cardHeight, items: members.slice(i, i + columns)});
+                top += cardHeight + gap;
+            }
+        });
+        if (!rows.length) {
+            rows.push({top: 0, height: HEADER_HEIGHT, empty: true});
+            top = HEADER_HEIGHT;
+        }
+        grid.style.height = top + 'px';
+        mounted.forEach(el => el.remove());
+        mounted.clear();
+        render();
+    }
+
+    function firstVisible(offset) {
+        let low = 0, high = rows.length - 1;
+        while (low < high) {
+            const mid = (low + high) >> 1;
+            if (rows[mid].top + rows[mid].height < offset) low = mid + 1;
+            else high = mid;
+        }
+        return low;
+    }
+
+    function createRow(row) {
+        const el = document.createElement('div');
+        el.className = 'virtual-row';
+        el.style.top = row.top + 'px';
+        el.style.height = row.height + 'px';
+        if (row.header) {
+            const title = document.createElement('h2');
+            title.className = 'section-title';
+            title.textContent = row.header;
+            el.appendChild(title);
+        } else if (row.empty) {
+            const empty = document.createElement('div');
+            empty.className = 'no-results';
+            empty.textContent = '找不到符合的創作者';
+            el.appendChild(empty);
+        } else {
+            el.style.gridTemplateColumns = 'repeat(' + columns + ', 1fr)';
+            row.items.forEach(i => el.appendChild(createCard(i)));
+        }
+        return el;
+    }
+
+    // 只掛載可視範圍（加上前後 OVERSCAN 列）內的列，其餘移除
+    function render() {
+        scheduled = false;
+        const offset = window.scrollY - (grid.getBoundingClientRect().top + window.scrollY);
+        const first = Math.max(0, firstVisible(offset) - OVERSCAN);
+        let last = first;
+        while (last < rows.length - 1 && rows[last].top < offset + window.innerHeight) last++;
+        last = Math.min(rows.length - 1, last + OVERSCAN);
+        mounted.forEach((el, index) => {
+            if (index < first || index > last) {
+                el.remove();
+                mounted.delete(index);
+            }
+        });
+        for (let index = first; index <= last; index++) {
+            if (!mounted.has(index)) {
+                const el = createRow(rows[index]);
+                grid.appendChild(el);
+                mounted.set(index, el);
+            }
+        }
+    }
+
+    function schedule() {
+        if (!scheduled) {
+            scheduled = true;
+            requestAnimationFrame(render);
+        }
+    }
+
+    function filter() {
+        const hits = lookup(input.value);
+        matched = hits ? hits.slice() : cards.map((_, i) => i);
+        layout();
+    }
+
+    let timer = null;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(filter, DEBOUNCE_MS);
+    });
+    window.addEventListener('scroll', schedule, {passive: true});
+    window.addEventListener('resize', layout);
+    layout();
+})();
+</script>
+"""
+
+def card_data(kol):
+    """虛擬化版面的卡片資料：[顯示名稱, 真名（與顯示名稱相同時為空）, 平台, 原圖, 縮圖 ID]"""
+    thumbs = kol.get('thumbs')
+    # 縮圖檔名為 <ID>-<尺寸>.<格式>，前端只需要 ID 就能組出所有版本
+    thumb_id = os.path.basename(thumbs['jpg'][0]).rsplit('-', 1)[0] if thumbs else 0
+    clean_name = kol['clean_name'] if kol['clean_name'] != kol['display_name'] else ''
+    return [kol['display_name'], clean_name, kol.get('platform', 'Manual'), kol['path'], thumb_id]
+
+def generate_virtual_html(results, a_zone, b_zone):
+    """卡片資料與搜尋索引以精簡 JSON 內嵌，由前端只渲染可視範圍內的卡片"""
+    data = {
+        'cards': [card_data(kol) for kol in a_zone + b_zone],
+        # 每區的標題與結束位置（cards 依 A區、B區 順序排列）
+        'sections': [['⭐ A區', len(a_zone)], ['📚 B區', len(a_zone) + len(b_zone)]],
+        'thumbDir': THUMB_DIR,
+        'cardSize': CARD_SIZE,
+        'scales': list(SCALES),
+        'thumbFormats': output_formats(),
+        'search': card_search_index(a_zone, b_zone),
+    }
+    data_json = embed_json(data)
+
+    full_html = f"""<!DOCTYPE html>
+<html lang="zh-TW">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>KOL 名單 - {datetime.now().strftime('%Y/%m/%d')}</title>
+    {css_style}
+    {virtual_css}
+</head>
+<body>
+    <h1>樊登新書發佈會創作者</h1>
+    <p class="stats">共 {len(results)} 位創作者（A區 {len(a_zone)} 位 / B區 {len(b_zone)} 位）</p>
+    <div class="search-container">
+        <span class="search-icon">🔍</span>
+        <input type="text" class="search-input" id="searchInput" placeholder="輸入姓名或社群名稱搜尋...">
+    </div>
+    <div class="virtual-grid" id="virtualGrid"></div>
+    <script id="kolData" type="application/json">{data_json}</script>
+    {search_script}
+    {virtual_script}
+</body>
+</html>"""
+    return full_html
+
+def main(full=False, virtual=False):
+    # 讀取並匹配圖片
+    results = match_images()
 
-with open(HTML_FILENAME, "w", encoding="utf-8") as f:
-    f.write(full_html)
+    results.sort(key=get_priority)
+
+    # 產生縮圖（只處理新增或變更的頭像）
+    thumbs = build_thumbnails([k['path'] for k in results])
+    for kol in results:
+        kol['thumbs'] = thumbs.get(kol['path'])
+
+    # 分區結果
+    a_zone = [k for k in results if get_priority(k)[0] == 0]
+    b_zone = [k for k in results if get_priority(k)[0] == 1]
+    print(f"A區: {len(a_zone)} 位, B區: {len(b_zone)} 位")
+
+    # 輸入沒變的卡片沿用建置快取中的片段（full=True 時全部重新產生）
+    cache = BuildCache(enabled=not full)
+    if virtual:
+        full_html = generate_virtual_html(results, a_zone, b_zone)
+    else:
+        full_html = generate_grid_html(results, a_zone, b_zone, cache)
+
+    if cache.write_if_changed(HTML_FILENAME, full_html):
+        print(f"HTML 已生成：{HTML_FILENAME}")
+    else:
+        print(f"HTML 內容未變更，略過寫入：{HTML_FILENAME}")
+    cache.save()
 
-print(f"HTML 已生成：{HTML_FILENAME}")
+if __name__ == "__main__":
+    main(full='--full' in sys.argv, virtual='--virtual' in sys.argv)
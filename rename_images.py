@@ -3,32 +3,25 @@
 """
 import os
 import json
-import re
+
+from avatar_store import get_avatar_store
+from kol_matcher import KolMatcher, safe_filename
 
 DOWNLOAD_DIR = "kol_avatars"
 KOL_DATA_FILE = r'd:\google antigravity\kolphoto\kol_list_cleaned.json'
 
-def safe_filename(name):
-    # 移除 Windows 不允許的字符
-    return re.sub(r'[<>:"/\\|?*]', '_', name)
-
 # 讀取 KOL 資料
 with open(KOL_DATA_FILE, 'r', encoding='utf-8') as f:
     kol_list = json.load(f)
 
-# 建立 name -> display_name 映射
-name_to_display = {}
-display_to_name = {}
-for kol in kol_list:
-    name = kol['name']
-    display = kol['display_name']
-    name_to_display[safe_filename(name)] = display
-    display_to_name[safe_filename(display)] = name
-
-# 取得所有圖片
-images = os.listdir(DOWNLOAD_DIR)
+# 取得所有圖片（忽略寫入中的暫存檔）
+images = [f for f in os.listdir(DOWNLOAD_DIR) if not f.startswith('.tmp-')]
+store = get_avatar_store()
 print(f"找到 {len(images)} 張圖片\n")
 
+# 以共用的比對索引一次對應所有圖片
+matches = KolMatcher(kol_list).match_all(os.path.splitext(img)[0] for img in images)
+
 rename_count = 0
 for img in images:
     img_name, ext = os.path.splitext(img)
@@ -38,24 +31,14 @@ for img in images:
     display_name = None
     real_name = None
     
-    # 嘗試用圖片名稱匹配 name
-    if img_name in name_to_display:
-        real_name = img_name
-        display_name = name_to_display[img_name]
-    # 嘗試用圖片名稱匹配 display_name
-    elif img_name in display_to_name:
-        display_name = img_name
-        real_name = display_to_name[img_name]
-    else:
-        # 部分匹配
-        for kol in kol_list:
-            safe_name = safe_filename(kol['name'])
-            safe_display = safe_filename(kol['display_name'])
-            if (safe_name in img_name or img_name in safe_name or
-                safe_display in img_name or img_name in safe_display):
-                real_name = kol['name']
-                display_name = kol['display_name']
-                break
+    kol, candidates = matches[img_name]
+    if kol:
+        real_name = kol['name']
+        display_name = kol['display_name']
+    elif candidates:
+        names = '、'.join(k['display_name'] for k in candidates)
+        print(f"模稜兩可: {img} 可能是：{names}")
+        continue
     
     if display_name and real_name:
         # 生成新檔名：社群名稱(姓名).ext
@@ -68,7 +51,12 @@ for img in images:
         
         if old_path != new_path and not os.path.exists(new_path):
             print(f"重命名: {img} -> {new_name}")
-            os.rename(old_path, new_path)
+            # 由 avatar_store 管理的圖片只需改 manifest 並重建 link
+            kol_key = store.find_by_view(img)
+            if kol_key:
+                store.rename_view(kol_key, new_name)
+            else:
+                os.rename(old_path, new_path)
             rename_count += 1
         elif old_path == new_path:
             print(f"保持: {img}")
@@ -77,4 +65,5 @@ for img in images:
     else:
         print(f"未匹配: {img}")
 
+store.compact()
 print(f"\n完成！重命名 {rename_count} 張圖片")
@@ -0,0 +1,191 @@
+"""
+社群連結 → 頭像 URL 的持久快取（SQLite）
+記錄每個 social_link 解析出的頭像 URL、平台，以及個人頁面與圖片的 ETag / Last-Modified，
+TTL 內直接命中；過期後由抓取方法以條件式請求取得個人頁面，304 時沿用快取內容、200 時直接解析新頁面
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+import http_client
+from http_client import HEADERS
+
+# --- 設定區 ---
+CACHE_FILE = "resolve_cache.sqlite"
+CACHE_TTL = 7 * 24 * 3600   # 快取有效期（秒），過期後需重新驗證
+MAX_ENTRIES = 5000          # 超過時依最後存取時間淘汰（LRU）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resolve_cache (
+    key TEXT PRIMARY KEY,
+    social_link TEXT,
+    platform TEXT,
+    avatar_url TEXT,
+    page_etag TEXT,
+    page_last_modified TEXT,
+    image_url TEXT,
+    image_etag TEXT,
+    image_last_modified TEXT,
+    image_path TEXT,
+    resolved_at REAL,
+    last_access REAL
+)
+"""
+
+def normalize_link(url):
+    """把社群連結正規化成快取 key（忽略大小寫、www/m 子網域、追蹤參數與結尾斜線）"""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parsed.path.rstrip('/')
+    # Facebook 數字 ID 放在 query 裡，其餘參數多半是追蹤碼
+    profile_id = parse_qs(parsed.query).get('id')
+    if path.endswith('profile.php') and profile_id:
+        path = f"{path}?id={profile_id[0]}"
+    return f"{host}{path}"
+
+def _conditional_headers(etag, last_modified):
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+class ResolveCache:
+    """以 normalized social_link 為 key 的 SQLite 快取（thread-safe）"""
+
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def get(self, social_link):
+        """取得快取紀錄（dict）並更新最後存取時間，沒有則回傳 None"""
+        key = normalize_link(social_link)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM resolve_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE resolve_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+        return dict(row)
+
+    def is_fresh(self, entry):
+        return bool(entry and entry['avatar_url'] and entry['resolved_at']
+                    and time.time() - entry['resolved_at'] < self.ttl)
+
+    def _upsert(self, social_link, **fields):
+        key = normalize_link(social_link)
+        now = time.time()
+        fields['last_access'] = now
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f"{col} = excluded.{col}" for col in fields)
+        with self.lock:
+            self.conn.execute(
+                f"INSERT INTO resolve_cache (key, social_link, {columns}) "
+                f"VALUES (?, ?, {placeholders}) "
+                f"ON CONFLICT(key) DO UPDATE SET {updates}",
+                (key, social_link, *fields.values()),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        self.conn.execute(
+            "DELETE FROM resolve_cache WHERE key IN ("
+            "SELECT key FROM resolve_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def put(self, social_link, platform, avatar_url):
+        """記錄新解析出的頭像 URL"""
+        self._upsert(social_link, platform=platform, avatar_url=avatar_url, resolved_at=time.time())
+
+    def touch(self, social_link):
+        """重新驗證成功（304），延長有效期"""
+        self._upsert(social_link, resolved_at=time.time())
+
+    def delete(self, social_link):
+        """移除紀錄（快取的頭像已確定無效時）"""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM resolve_cache WHERE key = ?", (normalize_link(social_link),)
+            )
+            self.conn.commit()
+
+    def save_page_validators(self, social_link, headers):
+        """記錄個人頁面的 ETag / Last-Modified"""
+        self._upsert(
+            social_link,
+            page_etag=headers.get('ETag'),
+            page_last_modified=headers.get('Last-Modified'),
+        )
+
+    def save_image(self, social_link, image_url, headers, image_path):
+        """記錄已下載圖片的來源、驗證標頭與本地路徑"""
+        self._upsert(
+            social_link,
+            image_url=image_url,
+            image_etag=headers.get('ETag'),
+            image_last_modified=headers.get('Last-Modified'),
+            image_path=image_path,
+        )
+
+    def image_headers(self, entry, image_url):
+        """同一張圖且本地檔案仍在時，回傳下載圖片用的條件式 headers"""
+        if (not entry or entry['image_url'] != image_url
+                or not entry['image_path'] or not os.path.exists(entry['image_path'])):
+            return {}
+        return _conditional_headers(entry['image_etag'], entry['image_last_modified'])
+
+    def fetch_page(self, social_link, platform):
+        """
+        取得個人頁面，快取中有頭像 URL 與頁面驗證標頭時改送條件式請求
+        回傳 (response, 快取的頭像 URL)：304 時延長有效期並回傳 (None, 快取的頭像 URL)；
+        其他情況回傳 (response, None)，200 時同時記錄新的驗證標頭，頁面內容由呼叫端解析
+        """
+        entry = self.get(social_link)
+        conditional = {}
+        if entry and entry['avatar_url']:
+            conditional = _conditional_headers(entry['page_etag'], entry['page_last_modified'])
+        response = http_client.get(
+            social_link, headers={**HEADERS, **conditional}, timeout=10, platform=platform,
+        )
+        if response.status_code == 304 and conditional:
+            self.touch(social_link)
+            return None, entry['avatar_url']
+        if response.status_code == 200:
+            self.save_page_validators(social_link, response.headers)
+        return response, None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_resolve_cache = None
+_resolve_cache_lock = threading.Lock()
+
+def get_resolve_cache():
+    """取得全域共用的 ResolveCache"""
+    global _resolve_cache
+    if _resolve_cache is None:
+        with _resolve_cache_lock:
+            if _resolve_cache is None:
+                _resolve_cache = ResolveCache()
+    return _resolve_cache
@@ -0,0 +1,80 @@
+"""
+平台解析器註冊表
+每個平台註冊一個網址判斷函式、一個 ID 擷取函式，以及依成本排序的抓取方法（TieredResolver），
+所有入口（kol_avatar_fetcher / kol_avatar_selenium）共用同一條分派路徑
+"""
+
+from tiered_resolver import TieredResolver, STATS_FILE
+
+class PlatformResolver:
+    """單一平台的註冊資訊"""
+
+    def __init__(self, name, matcher, extract_id=None, strategies=(), stats_file=STATS_FILE):
+        self.name = name
+        self.matcher = matcher
+        self.extract_id = extract_id
+        self.tiers = TieredResolver(name, strategies, stats_file=stats_file)
+
+    def identity(self, url):
+        """回傳 (平台, 帳號 ID)，無法擷取 ID 時回傳 None"""
+        account_id = self.extract_id(url) if self.extract_id else None
+        return (self.name, account_id) if account_id else None
+
+class ResolverRegistry:
+    """依註冊順序比對網址並分派到對應平台的解析器"""
+
+    def __init__(self, stats_file=STATS_FILE):
+        self.stats_file = stats_file
+        self.platforms = []
+
+    def register(self, name, matcher, extract_id=None, strategies=()):
+        platform = PlatformResolver(name, matcher, extract_id, strategies, stats_file=self.stats_file)
+        self.platforms = [p for p in self.platforms if p.name != name] + [platform]
+        return platform
+
+    def add_strategy(self, name, strategy):
+        """替已註冊的平台加入抓取方法"""
+        self.get(name).tiers.add(strategy)
+
+    def get(self, name):
+        for platform in self.platforms:
+            if platform.name == name:
+                return platform
+        raise KeyError(name)
+
+    def match(self, url):
+        if not url or not url.startswith('http'):
+            return None
+        for platform in self.platforms:
+            if platform.matcher(url):
+                return platform
+        return None
+
+    def detect(self, url):
+        """只依網址判斷平台名稱，不發出任何請求"""
+        platform = self.match(url)
+        return platform.name if platform else None
+
+    def identity(self, url):
+        platform = self.match(url)
+        return platform.identity(url) if platform else None
+
+    def resolve(self, url, exclude=()):
+        """回傳 (頭像 URL, 平台名稱)；exclude 中的頭像 URL 不會被採用"""
+        platform = self.match(url)
+        if not platform:
+            return None, None
+        avatar_url, _ = platform.tiers.resolve(url, exclude)
+        return avatar_url, platform.name
+
+    def save_stats(self):
+        for platform in self.platforms:
+            if platform.tiers.strategies:
+                platform.tiers.save_stats()
+
+    def summary(self):
+        """{平台: [(方法, 命中, 嘗試)]}"""
+        return {
+            platform.name: platform.tiers.summary()
+            for platform in self.platforms if platform.tiers.strategies
+        }
@@ -0,0 +1,93 @@
+"""
+抓取流程的執行紀錄（JSONL）
+每位 KOL 的狀態（pending / resolved / downloaded / failed）、嘗試次數、最後錯誤與時間
+會在執行過程中逐筆附加寫入，程式中斷後重跑即可從中斷處繼續，並略過已確定失敗的連結
+"""
+
+import os
+import json
+import time
+import threading
+
+from avatar_store import atomic_write
+
+# --- 設定區 ---
+MANIFEST_FILE = "run_manifest.jsonl"
+MAX_ATTEMPTS = 3    # 失敗達此次數即視為永久失敗，之後的執行直接略過
+
+PENDING = 'pending'
+RESOLVED = 'resolved'
+DOWNLOADED = 'downloaded'
+FAILED = 'failed'
+
+class RunManifest:
+    """以 KOL key 為單位的狀態紀錄（thread-safe）"""
+
+    def __init__(self, path=MANIFEST_FILE, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.records = self._load()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """重播 JSONL，每個 key 以最後一筆為準；忽略中斷時寫壞的最後一行"""
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record['key']] = record
+        return records
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def mark(self, key, state, **fields):
+        """更新狀態並立即寫入檔案（checkpoint）"""
+        with self.lock:
+            record = dict(self.records.get(key, {'key': key, 'attempts': 0}))
+            record.update(fields)
+            record['state'] = state
+            record['updated_at'] = time.time()
+            if state == FAILED:
+                record['permanent'] = record['attempts'] >= self.max_attempts
+            elif state == DOWNLOADED:
+                record.pop('error', None)
+                record['permanent'] = False
+            self.records[key] = record
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+            return record
+
+    def start(self, key):
+        """開始處理某位 KOL：嘗試次數 +1，狀態設為 pending"""
+        attempts = self.records.get(key, {}).get('attempts', 0) + 1
+        return self.mark(key, PENDING, attempts=attempts)
+
+    def is_permanent_failure(self, key):
+        record = self.records.get(key)
+        return bool(record and record['state'] == FAILED and record.get('permanent'))
+
+    def downloaded_path(self, key):
+        """已下載且檔案仍存在時回傳路徑"""
+        record = self.records.get(key)
+        if record and record['state'] == DOWNLOADED and os.path.exists(record.get('path', '')):
+            return record['path']
+        return None
+
+    def compact(self):
+        """把紀錄壓縮成每個 key 一行"""
+        with self.lock:
+            self.file.close()
+            lines = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in self.records.values())
+            atomic_write(self.path, lines.encode('utf-8'))
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,107 @@
+"""
+頁面搜尋用的倒排索引
+產生頁面時把每位 KOL 的名稱切成 CJK 單字與雙字詞、英數字詞的子字串（與舊的 includes() 篩選結果一致），
+並加上（可選的）簡體字形與拼音 / 注音鍵，序列化成 JSON，前端輸入時只需查表並取交集
+"""
+
+import re
+import unicodedata
+import importlib.util
+
+# --- 設定區 ---
+MAX_PREFIX = 12     # 英數字詞的子字串與拼音 / 注音鍵的前綴最多索引到幾個字
+
+# 切詞規則會一起序列化給前端使用，兩邊一致
+CJK_PATTERN = '[\u3400-\u9fff\uf900-\ufaff]'
+TOKEN_PATTERN = f"{CJK_PATTERN}+|[a-z0-9\u00c0-\u024f]+|[\u3105-\u3129]+"
+TOKEN_RE = re.compile(TOKEN_PATTERN)
+CJK_RE = re.compile(CJK_PATTERN)
+
+_converter = None
+_converter_loaded = False
+
+def get_simplified_converter():
+    """opencc 繁轉簡轉換器，未安裝時回傳 None"""
+    global _converter, _converter_loaded
+    if not _converter_loaded:
+        _converter_loaded = True
+        try:
+            import opencc
+            _converter = opencc.OpenCC('t2s')
+        except Exception:
+            _converter = None
+    return _converter
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text).casefold()
+
+def tokens(text):
+    return TOKEN_RE.findall(normalize(text))
+
+def token_terms(token, substrings=True):
+    """
+    CJK 字串 → 單字 + 雙字詞；其他字詞 → 每個位置起算的子字串（"susu" 找得到 "katiasusu"）
+    substrings 為 False 時只取前綴（拼音 / 注音鍵用，避免 "ang" 之類的片段命中大量名稱）
+    """
+    if CJK_RE.match(token):
+        return set(token) | {token[i:i + 2] for i in range(len(token) - 1)}
+    starts = range(len(token)) if substrings else (0,)
+    return {token[i:i + n] for i in starts for n in range(1, min(len(token) - i, MAX_PREFIX) + 1)}
+
+def romanization_keys(text):
+    """拼音全拼、拼音首字母、注音與注音首字（pypinyin 未安裝時回傳空列表）"""
+    try:
+        from pypinyin import Style, lazy_pinyin
+    except ImportError:
+        return []
+    keys = []
+    for token in tokens(text):
+        if not CJK_RE.match(token):
+            continue
+        keys.append(''.join(lazy_pinyin(token, style=Style.NORMAL)))
+        keys.append(''.join(lazy_pinyin(token, style=Style.FIRST_LETTER)))
+        zhuyin = ''.join(lazy_pinyin(token, style=Style.BOPOMOFO))
+        keys.append(re.sub('[^\u3105-\u3129]', '', zhuyin))
+        keys.append(''.join(lazy_pinyin(token, style=Style.BOPOMOFO_FIRST)))
+    return [key for key in keys if key]
+
+def document_terms(names):
+    """一位 KOL 所有名稱的索引詞"""
+    texts = list(names)
+    converter = get_simplified_converter()
+    if converter:
+        texts += [converter.convert(name) for name in names]
+    terms = set()
+    for text in texts:
+        for token in tokens(text):
+            terms |= token_terms(token)
+    for key in romanization_keys(' '.join(names)):
+        terms |= token_terms(normalize(key), substrings=False)
+    return terms
+
+def missing_features():
+    """未安裝選用套件而停用的搜尋功能說明"""
+    missing = []
+    if get_simplified_converter() is None:
+        missing.append("opencc 未安裝，簡體字查詢（例如「张修修」）不會有結果")
+    if importlib.util.find_spec('pypinyin') is None:
+        missing.append("pypinyin 未安裝，拼音 / 注音查詢（例如「zhang」）不會有結果")
+    return missing
+
+def build_search_index(documents):
+    """
+    documents 為每位 KOL 的名稱列表，回傳 {'terms': {詞: [文件編號, ...]}, 'maxPrefix', 'tokenPattern', 'cjkPattern'}
+    文件編號依 documents 的順序，posting list 為遞增排序
+    """
+    for notice in missing_features():
+        print(f"  [搜尋] {notice}")
+    postings = {}
+    for doc_id, names in enumerate(documents):
+        for term in document_terms([name for name in names if name]):
+            postings.setdefault(term, []).append(doc_id)
+    return {
+        'terms': dict(sorted(postings.items())),
+        'maxPrefix': MAX_PREFIX,
+        'tokenPattern': TOKEN_PATTERN,
+        'cjkPattern': CJK_PATTERN,
+    }
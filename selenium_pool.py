@@ -0,0 +1,86 @@
+"""
+Selenium WebDriver 池
+保留 N 個可重複使用的 headless 瀏覽器，以 checkout / 歸還的方式讓多個頁面並行載入；
+歸還前做健康檢查，每個 driver 載入 K 個頁面後自動回收重建，避免記憶體持續膨脹
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+
+# --- 設定區 ---
+POOL_SIZE = 3               # 同時開啟的瀏覽器數量
+MAX_PAGES_PER_DRIVER = 25   # 每個 driver 載入幾個頁面後回收
+CHECKOUT_TIMEOUT = 120      # 等待可用 driver 的秒數上限
+
+class DriverPool:
+    """以 factory 建立 driver 的固定大小池（thread-safe）"""
+
+    def __init__(self, factory, size=POOL_SIZE, max_pages=MAX_PAGES_PER_DRIVER):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        # 每個槽位存 [driver, 已載入頁數]；driver 為 None 表示需要時才建立
+        self.slots = queue.Queue()
+        for _ in range(size):
+            self.slots.put([None, 0])
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _is_healthy(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @contextmanager
+    def driver(self):
+        """
+        借出一個 driver，用完自動歸還
+        無法建立 driver 時 yield None，呼叫端應視為抓取失敗
+        """
+        if self.closed:
+            yield None
+            return
+        slot = self.slots.get(timeout=CHECKOUT_TIMEOUT)
+        try:
+            if slot[0] is not None and not self._is_healthy(slot[0]):
+                self._quit(slot[0])
+                slot[0], slot[1] = None, 0
+            if slot[0] is None:
+                slot[0] = self.factory()
+                slot[1] = 0
+            yield slot[0]
+            if slot[0] is not None:
+                slot[1] += 1
+                if slot[1] >= self.max_pages or not self._is_healthy(slot[0]):
+                    self._quit(slot[0])
+                    slot[0], slot[1] = None, 0
+        finally:
+            if self.closed and slot[0] is not None:
+                self._quit(slot[0])
+                slot[0], slot[1] = None, 0
+            self.slots.put(slot)
+
+    def shutdown(self):
+        """關閉池中所有 driver"""
+        with self.lock:
+            self.closed = True
+            drained = []
+            while True:
+                try:
+                    drained.append(self.slots.get_nowait())
+                except queue.Empty:
+                    break
+            for slot in drained:
+                if slot[0] is not None:
+                    self._quit(slot[0])
+                    slot[0], slot[1] = None, 0
+                self.slots.put(slot)
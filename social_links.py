@@ -0,0 +1,89 @@
+"""
+社群連結解析（不依賴任何第三方套件）
+由網址判斷平台並擷取帳號 ID（IG 帳號、FB ID、YT 頻道）；
+platforms 的解析器註冊表、fetch_engine 與清洗用的 kol_dedup 共用這裡的規則
+"""
+
+import re
+
+# 各平台的網址主機名稱（依序比對，第一個符合的平台為準）
+PLATFORM_HOSTS = {
+    'Instagram': ('instagram.com',),
+    'Facebook': ('facebook.com',),
+    'YouTube': ('youtube.com',),
+    'X/Twitter': ('x.com', 'twitter.com'),
+}
+
+def extract_instagram_username(url):
+    """從 Instagram URL 提取用戶名"""
+    patterns = [
+        r'instagram\.com/([^/?]+)',
+        r'instagram\.com/p/[^/]+.*?by=([^&]+)',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            username = match.group(1).strip()
+            if username not in ['p', 'reel', 'stories', 'explore', 'accounts', 'about']:
+                return username
+    return None
+
+def extract_facebook_id(url):
+    """從 Facebook URL 提取用戶 ID 或用戶名"""
+    patterns = [
+        r'facebook\.com/profile\.php\?id=(\d+)',
+        r'facebook\.com/people/[^/]+/(\d+)',
+        r'facebook\.com/([^/?]+)',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            result = match.group(1).strip()
+            if result not in ['p', 'share', 'sharer', 'dialog', 'watch', 'groups', 'events']:
+                return result
+    return None
+
+def extract_youtube_channel(url):
+    """從 YouTube URL 提取頻道資訊"""
+    patterns = [
+        r'youtube\.com/@([^/?]+)',
+        r'youtube\.com/channel/([^/?]+)',
+        r'youtube\.com/c/([^/?]+)',
+        r'youtube\.com/user/([^/?]+)',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            return match.group(1).strip()
+    return None
+
+# 可擷取帳號 ID 的平台（X/Twitter 只用來辨識平台）
+ID_EXTRACTORS = {
+    'Instagram': extract_instagram_username,
+    'Facebook': extract_facebook_id,
+    'YouTube': extract_youtube_channel,
+}
+
+def host_matcher(*hosts):
+    """產生「網址包含任一主機名稱」的判斷函式"""
+    def matches(url):
+        url_lower = url.lower()
+        return any(host in url_lower for host in hosts)
+    return matches
+
+def detect_platform(url):
+    """只依網址判斷平台名稱，不發出任何請求；不是社群連結時回傳 None"""
+    if not url or not url.startswith('http'):
+        return None
+    url_lower = url.lower()
+    for platform, hosts in PLATFORM_HOSTS.items():
+        if any(host in url_lower for host in hosts):
+            return platform
+    return None
+
+def link_identity(url):
+    """回傳 (平台, 帳號 ID)，無法辨識平台或擷取 ID 時回傳 None"""
+    platform = detect_platform(url)
+    extract_id = ID_EXTRACTORS.get(platform)
+    account_id = extract_id(url) if extract_id else None
+    return (platform, account_id) if account_id else None
@@ -0,0 +1,137 @@
+"""
+頭像縮圖產生器
+把 kol_avatars/ 的原圖裁成固定大小的正方形縮圖（1x / 2x），輸出 WebP、可選的 AVIF 與 JPEG 備援；
+以多個 process 平行處理，輸出檔名含原圖 hash，只有新增或變更的頭像才會重新產生
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+from avatar_store import atomic_write, publish_temp_file
+
+# --- 設定區 ---
+THUMB_DIR = "thumbnails"
+INDEX_FILE = os.path.join(THUMB_DIR, "index.json")
+CARD_SIZE = 180             # 卡片顯示尺寸（CSS px）
+SCALES = (1, 2)             # 產生 1x 與 2x
+ENABLE_AVIF = False         # Pillow 支援 AVIF 時可開啟
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+def pillow_available():
+    return importlib.util.find_spec('PIL') is not None
+
+def avif_available():
+    try:
+        from PIL import features
+        return features.check('avif')
+    except Exception:
+        return False
+
+def output_formats():
+    formats = ['webp', 'jpg']
+    if ENABLE_AVIF and avif_available():
+        formats.insert(0, 'avif')
+    return formats
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def variant_path(digest, scale, fmt):
+    return os.path.join(THUMB_DIR, f"{digest[:16]}-{CARD_SIZE * scale}.{fmt}")
+
+def render_variants(src, digest, formats):
+    """在子 process 中產生單張原圖的所有縮圖（已存在的略過）"""
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        for scale in SCALES:
+            size = CARD_SIZE * scale
+            # 與卡片 CSS 的 object-position: center top 一致，保留上方（臉部）
+            thumb = ImageOps.fit(img, (size, size), method=Image.LANCZOS, centering=(0.5, 0.0))
+            for fmt in formats:
+                path = variant_path(digest, scale, fmt)
+                if os.path.exists(path):
+                    continue
+                # 每次寫入用各自的暫存檔，同時處理相同內容的 process 不會互相覆寫
+                fd, tmp_path = tempfile.mkstemp(dir=THUMB_DIR, prefix='.tmp-')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        if fmt == 'jpg':
+                            thumb.save(f, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                        elif fmt == 'webp':
+                            thumb.save(f, 'WEBP', quality=WEBP_QUALITY, method=6)
+                        else:
+                            thumb.save(f, 'AVIF', quality=AVIF_QUALITY)
+                    publish_temp_file(tmp_path, path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+    return src
+
+def _load_index():
+    if os.path.exists(INDEX_FILE):
+        with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def build_thumbnails(paths, max_workers=None):
+    """
+    為每張原圖產生縮圖，回傳 {原圖路徑: {格式: [1x 路徑, 2x 路徑]}}
+    原圖 hash 以 (大小, 修改時間) 快取在 index.json，未變更的檔案不需重新讀取
+    """
+    if not pillow_available():
+        print("  [縮圖] Pillow 未安裝，略過縮圖產生")
+        return {}
+
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    index = _load_index()
+    formats = output_formats()
+
+    digests = {}
+    jobs = {}   # digest → 原圖路徑；內容相同的多張原圖只產生一次
+    for path in paths:
+        stat = os.stat(path)
+        cached = index.get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+            digest = cached['sha256']
+        else:
+            digest = file_digest(path)
+            index[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest}
+        digests[path] = digest
+        if digest not in jobs and not all(
+                os.path.exists(variant_path(digest, s, f)) for s in SCALES for f in formats):
+            jobs[digest] = path
+
+    if jobs:
+        print(f"  [縮圖] 產生 {len(jobs)} 張新頭像的縮圖")
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(render_variants, path, digest, formats) for digest, path in jobs.items()]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"  [縮圖] 失敗: {e}")
+
+    atomic_write(INDEX_FILE, json.dumps(index, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    thumbs = {}
+    for path, digest in digests.items():
+        variants = {
+            fmt: [variant_path(digest, s, fmt) for s in SCALES]
+            for fmt in formats
+        }
+        if all(os.path.exists(p) for paths_ in variants.values() for p in paths_):
+            thumbs[path] = variants
+    return thumbs
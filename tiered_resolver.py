@@ -0,0 +1,106 @@
+"""
+分層頭像解析器
+同一平台的多種抓取方法依序嘗試（便宜的 HTTP 方法在前，瀏覽器在後），
+並記錄每種方法的命中率（每次嘗試也記為 metrics 的 resolve span），依「預期成本 = 成本 / 命中率」自動調整嘗試順序
+"""
+
+import os
+import json
+import threading
+
+import metrics
+from avatar_store import atomic_write
+
+# --- 設定區 ---
+STATS_FILE = "resolver_stats.json"
+
+class Strategy:
+    """單一抓取方法：fetch(url) 回傳頭像 URL 或 None；applies(url) 為 False 時直接略過"""
+
+    def __init__(self, name, fetch, cost=1.0, applies=None):
+        self.name = name
+        self.fetch = fetch
+        self.cost = cost
+        self.applies = applies
+
+class TieredResolver:
+    """依歷史命中率排序的多層解析器（thread-safe）"""
+
+    def __init__(self, platform, strategies, stats_file=STATS_FILE):
+        self.platform = platform
+        self.strategies = list(strategies)
+        self.stats_file = stats_file
+        self.lock = threading.Lock()
+        self.stats = self._load_stats()
+
+    def _load_stats(self):
+        if self.stats_file and os.path.exists(self.stats_file):
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get(self.platform, {})
+        return {}
+
+    def hit_rate(self, name):
+        """以 Laplace 平滑估計命中率，沒有紀錄時為 0.5"""
+        record = self.stats.get(name, {})
+        return (record.get('hits', 0) + 1) / (record.get('attempts', 0) + 2)
+
+    def ordered(self):
+        """依預期成本排序；成本相同時保留原本的順序"""
+        with self.lock:
+            return sorted(self.strategies, key=lambda s: s.cost / self.hit_rate(s.name))
+
+    def add(self, strategy):
+        """加入方法；同名的方法會被取代"""
+        with self.lock:
+            self.strategies = [s for s in self.strategies if s.name != strategy.name]
+            self.strategies.append(strategy)
+
+    def record(self, name, success):
+        with self.lock:
+            record = self.stats.setdefault(name, {'attempts': 0, 'hits': 0})
+            record['attempts'] += 1
+            if success:
+                record['hits'] += 1
+
+    def resolve(self, url, exclude=()):
+        """
+        依序嘗試各方法，回傳 (頭像 URL, 成功的方法名稱)；全部失敗回傳 (None, None)
+        exclude 為已被判定無效的頭像 URL（例如預設頭像），方法回傳這些 URL 時視為未命中
+        """
+        for strategy in self.ordered():
+            if strategy.applies and not strategy.applies(url):
+                continue
+            with metrics.span('resolve', platform=self.platform, strategy=strategy.name) as span:
+                try:
+                    avatar_url = strategy.fetch(url)
+                except Exception as e:
+                    span['error'] = type(e).__name__
+                    avatar_url = None
+                if avatar_url in exclude:
+                    avatar_url = None
+                span['hit'] = bool(avatar_url)
+            self.record(strategy.name, bool(avatar_url))
+            if avatar_url:
+                return avatar_url, strategy.name
+        return None, None
+
+    def save_stats(self):
+        """把命中率寫回 STATS_FILE（保留其他平台的紀錄）"""
+        if not self.stats_file:
+            return
+        with self.lock:
+            all_stats = {}
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    all_stats = json.load(f)
+            all_stats[self.platform] = self.stats
+            data = json.dumps(all_stats, ensure_ascii=False, indent=2).encode('utf-8')
+            atomic_write(self.stats_file, data)
+
+    def summary(self):
+        """各方法的命中紀錄，依目前排序列出"""
+        return [
+            (s.name, self.stats.get(s.name, {}).get('hits', 0),
+             self.stats.get(s.name, {}).get('attempts', 0))
+            for s in self.ordered()
+        ]
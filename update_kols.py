@@ -1,5 +1,7 @@
 import json
 
+from kol_dedup import DedupIndex
+
 with open('kol_list_cleaned.json', 'r', encoding='utf-8') as f:
     data = json.load(f)
 
@@ -7,15 +9,18 @@ new_kols = [
     {'name': '李建復', 'display_name': '愛播聽書podcast', 'social_link': 'https://www.facebook.com/aibotingshupodcast/', 'email': ''},
 ]
 
-existing_names = set(k['name'] for k in data)
-existing_displays = set(k['display_name'] for k in data)
+# 名稱寫法不同（空白、全形 / 半形括號）或同一社群帳號的 KOL 也視為已存在
+index = DedupIndex()
+for kol in data:
+    index.add(kol)
 
 for new_kol in new_kols:
-    if new_kol['name'] not in existing_names and new_kol['display_name'] not in existing_displays:
+    duplicate = index.add(new_kol)
+    if duplicate is None:
         data.append(new_kol)
         print(f"Added: {new_kol['display_name']}")
     else:
-        print(f"Already exists: {new_kol['display_name']}")
+        print(f"Already exists: {new_kol['display_name']} ({duplicate['display_name']})")
 
 with open('kol_list_cleaned.json', 'w', encoding='utf-8') as f:
     json.dump(data, f, ensure_ascii=False, indent=2)